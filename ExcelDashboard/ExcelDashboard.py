@@ -13,12 +13,16 @@
 # now type: 'streamlit run ExcelDashboard.py'
 # to close, type into terminal CTRL + C, then close page
 #
-# LIBRARIES: streamlit, plotly-express, pandas, openpyxl
+# LIBRARIES: streamlit, plotly-express, pandas, openpyxl, pyarrow
 
-import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from dashboard_core import FILTERS, SALES_WORKBOOKS, compute_selection, filter_options
+from figure_cache import FigureCache, selection_key
+from pagination import PAGE_SIZE, get_page, page_count
+from sales_dataset import SalesDataset
+
 def main():
     # --- Configuration of web-app
     # set title, icon, and layout
@@ -29,68 +33,68 @@ def main():
         )
 
     # create pandas dataframe of excel data
-    # we wrap into function so we can cache the data
-    # it will not be loaded every refresh unless the file changes
-    @st.cache
-    def get_data_from_excel():
-        df = pd.read_excel(
-            io='supermarkt_sales.xlsx',
-            engine='openpyxl',
-            sheet_name='Sales',
-            skiprows=3,
-            usecols='B:R',
-            nrows=1000
-            )
-
-        # Make new column - time of day in hours ('hour')
-        # we want to get the hours from 'Time' in format hours:minutes:seconds
-        # by default, it is not in this format (its in 24hr digital)
-        # we must create the 'hour' column to be in this format
-        df['hour'] = pd.to_datetime(df['Time'], format='%H:%M:%S').dt.hour  # dt is datetime
-
-        return df
-
-    df = get_data_from_excel()
+    # the data is loaded once and shared by every session (see sales_dataset.py), together with what is built from it:
+    # the pre-aggregated cube (see aggregates.py), so changing a filter does not rescan every row
+    # the bitmap index (see filter_index.py), used to filter the rows without df.query
+    # and a version of the data, used to key the figure cache
+    # on a cold start the data comes from the sidecar cache (see data_loader.py), so openpyxl is only used when the workbook changed
+    # a background thread watches the workbooks, rows appended to them are added without reloading everything
+    @st.experimental_singleton
+    def get_sales_dataset():
+        dataset = SalesDataset(SALES_WORKBOOKS, sheet_names=('Sales',))
+        dataset.start_watching()
+        return dataset
+
+    # one cache of figures for all sessions, experimental_singleton makes sure it is never copied or hashed
+    @st.experimental_singleton
+    def get_figure_cache():
+        return FigureCache()
+
+    dataset = get_sales_dataset()
+    snapshot = dataset.snapshot()  # the same version of everything for this whole rerun
+    df, _, _, time_index, dataset_version = snapshot
 
     # --- Sidebar
     # this contains our filters
-    # we want to be able to filter by city, customer type, and gender
+    # we want to be able to filter by city, customer type, and gender (see FILTERS), and by a range of dates
     st.sidebar.header('Please Filter Here:')
 
-    city = st.sidebar.multiselect(
-        'Select the City:',
-        options=df['City'].unique(),
-        default=df['City'].unique()
-        )  # multiselect widget allowing the user to select a city, default values are all cities
+    live_refresh = st.sidebar.checkbox('Refresh when the workbook changes', value=False)
 
-    customer_type = st.sidebar.multiselect(
-        'Select the Customer Type:',
-        options=df['Customer_type'].unique(),
-        default=df['Customer_type'].unique()
-        )
+    # a multiselect widget per filter allowing the user to select values, default values are all values (i.e. all cities)
+    selections = {}
+    for column, options in filter_options(df).items():
+        selections[column] = st.sidebar.multiselect(FILTERS[column], options=options, default=options)
 
-    gender = st.sidebar.multiselect(
-        'Select the Gender:',
-        options=df['Gender'].unique(),
-        default=df['Gender'].unique()
-        )
+    # date range, by default all the dates of the data
+    # while the user is picking the range only the start is selected, so the whole range is used until the end is picked
+    bounds = time_index.date_bounds()
+    start_date, end_date = bounds if bounds is not None else (None, None)
+    if bounds is not None:
+        date_range = st.sidebar.date_input('Select the Dates:', value=bounds, min_value=bounds[0], max_value=bounds[1])
+        if len(date_range) == 2:
+            start_date, end_date = date_range
 
-    # Query dataframe for specific filters, the @ signals a variable
-    df_selection = df.query(
-        'City == @city & Customer_type == @customer_type & Gender == @gender'
-        )
+    # Get the KPI's and chart data, and the positions of the selected rows (see dashboard_core.py)
+    # the rows themselves are only copied out when needed (the table below only builds the visible page)
+    selection, selected_positions = compute_selection(snapshot, selections, start_date, end_date)
 
     # --- Mainpage
     st.title(':bar_chart: Sales Dashboard')
     st.markdown('##')
 
+    # nothing to show (i.e. no sales between the selected dates), the averages below would not be numbers
+    if selection['transactions'] == 0:
+        st.warning('There is no data for this selection, please change the filters.')
+        st.stop()
+
     # Top KPI's (Key Performance Indicator - value that demonstrates how effectively a company is acheiving key objectives)
-    total_sales = int(df_selection['Total'].sum())  # sums all entries in Total column
+    total_sales = int(selection['total_sales'])  # sum of all entries in Total column
 
-    average_rating = round(df_selection['Rating'].mean(), 1)
+    average_rating = round(selection['average_rating'], 1)
     star_rating = ':star:' * int(round(average_rating, 0))  # round mean rating to 0 decimal places, so round to integer; make this many stars
 
-    average_sales_per_transaction = round(df_selection['Total'].mean(), 2)
+    average_sales_per_transaction = round(selection['average_sale'], 2)
 
     # Display the total sales, ratings, and average sales per transaction
     left_column, middle_column, right_column = st.columns(3)
@@ -108,51 +112,63 @@ def main():
 
     # --- Bar Charts
     # - Sales by Product line
-    # get new pandas dataframe of the old one sorted by product line
-    # we want to see the sum total per product line
+    # pandas dataframe of the sum total per product line, sorted in ascending order (summed from the cube)
     # we should then plot the sum total on one axis and the product lines on the other
-    sales_by_product_line = df_selection.groupby(by=['Product line']).sum()  # group by product line, then add all figures
-    sales_by_product_line = sales_by_product_line[['Total']].sort_values(by='Total')  # then get all rows in total column and sort in ascending order
-
-    # create the horizontal bar chart with total on the x-axis and the product lines on the y
-    # can set the color of the bars and the template from plotly
-    fig_product_sales = px.bar(
-        sales_by_product_line,
-        x='Total',
-        y=sales_by_product_line.index,  # the product lines are the indexes of this dataframe
-        orientation='h',
-        title='<b>Sales by Product Line</b>',  # can use HTML to make bold text
-        color_discrete_sequence=['#0083B8'] * len(sales_by_product_line),  # each bar is colored with this hex-code, the sequence by default changes the color of each bar
-        template='plotly_white'  # see 'https://plotly.com/python/templates/'
-        )
-
-    # update to get rid of background color (set to white) and the grid-lines
-    fig_product_sales.update_layout(
-        plot_bgcolor='rgba(0, 0, 0, 0)',
-        xaxis=dict(showgrid=False)
-        )
+    sales_by_product_line = selection['sales_by_product_line']
 
     # - Sales by Hour
-    # get new pandas dataframe of the old one sorted by hour, with the totals sorted ascending
-    sales_by_hour = df_selection.groupby(by=['hour']).sum()
-    sales_by_hour = sales_by_hour[['Total']].sort_values(by='Total')
-
-    # create the vertical bar chart with the hours on the x and total on the y
-    fig_hourly_sales = px.bar(
-        sales_by_hour,
-        x=sales_by_hour.index,  # the hours are the indexes
-        y='Total',
-        title='<b>Sales by Hour</b>',
-        color_discrete_sequence=['#0083B8'] * len(sales_by_hour),
-        template='plotly_white'
-        )
+    # pandas dataframe of the sum total per hour, with the totals sorted ascending (summed from the cube)
+    sales_by_hour = selection['sales_by_hour']
+
+    # - Figures
+    # building the figures is slow, so they are kept in a cache shared by all sessions (see figure_cache.py)
+    # the same selection of filters (in any order) on the same data reuses the figures built before
+    def build_figures():
+        # create the horizontal bar chart with total on the x-axis and the product lines on the y
+        # can set the color of the bars and the template from plotly
+        fig_product_sales = px.bar(
+            sales_by_product_line,
+            x='Total',
+            y=sales_by_product_line.index,  # the product lines are the indexes of this dataframe
+            orientation='h',
+            title='<b>Sales by Product Line</b>',  # can use HTML to make bold text
+            color_discrete_sequence=['#0083B8'] * len(sales_by_product_line),  # each bar is colored with this hex-code, the sequence by default changes the color of each bar
+            template='plotly_white'  # see 'https://plotly.com/python/templates/'
+            )
 
-    # update to get rid of background color (set to white) and the grid-lines
-    fig_hourly_sales.update_layout(
-        plot_bgcolor='rgba(0, 0, 0, 0)',
-        xaxis=dict(tickmode='linear'),  # makes sure each hour is labeled (12, 13, 14, etc.)
-        yaxis=dict(showgrid=False)
-        )
+        # update to get rid of background color (set to white) and the grid-lines
+        fig_product_sales.update_layout(
+            plot_bgcolor='rgba(0, 0, 0, 0)',
+            xaxis=dict(showgrid=False)
+            )
+
+        # create the vertical bar chart with the hours on the x and total on the y
+        fig_hourly_sales = px.bar(
+            sales_by_hour,
+            x=sales_by_hour.index,  # the hours are the indexes
+            y='Total',
+            title='<b>Sales by Hour</b>',
+            color_discrete_sequence=['#0083B8'] * len(sales_by_hour),
+            template='plotly_white'
+            )
+
+        # update to get rid of background color (set to white) and the grid-lines
+        fig_hourly_sales.update_layout(
+            plot_bgcolor='rgba(0, 0, 0, 0)',
+            xaxis=dict(tickmode='linear'),  # makes sure each hour is labeled (12, 13, 14, etc.)
+            yaxis=dict(showgrid=False)
+            )
+
+        return fig_product_sales, fig_hourly_sales
+
+    figure_cache = get_figure_cache()
+    figure_key = selection_key(dict(selections, Date=[str(start_date), str(end_date)]), dataset_version)
+
+    figures = figure_cache.get(figure_key)
+    if figures is None:
+        figures = build_figures()
+        figure_cache.put(figure_key, figures)
+    fig_product_sales, fig_hourly_sales = figures
 
     # - Display
     # Display the two bar charts side-by-side
@@ -165,8 +181,33 @@ def main():
     left_column.dataframe(sales_by_hour)
     right_column.dataframe(sales_by_product_line)
 
-    # Display the original dataframe
-    st.dataframe(df_selection)
+    # Display the original dataframe, one page at a time
+    # only the visible page is built and sent to the browser, sorting and choosing columns is done here on the server
+    st.markdown('---')
+    total_rows = len(selected_positions)
+
+    sort_column, order_column, page_column = st.columns(3)
+    sort_by = sort_column.selectbox('Sort by:', options=['(none)'] + list(df.columns))
+    ascending = order_column.radio('Order:', options=['Ascending', 'Descending'], horizontal=True) == 'Ascending'
+    page = page_column.number_input(
+        f'Page (of {page_count(total_rows):,}):',
+        min_value=1,
+        max_value=page_count(total_rows),
+        value=1
+        )
+    columns = st.multiselect('Columns:', options=list(df.columns), default=list(df.columns))
+
+    st.dataframe(get_page(
+        df,
+        selected_positions,
+        page,
+        columns=columns,
+        sort_by=None if sort_by == '(none)' else sort_by,
+        ascending=ascending
+        ))
+
+    first_row = min((page - 1) * PAGE_SIZE + 1, total_rows)
+    st.caption(f'Showing rows {first_row:,} to {min(page * PAGE_SIZE, total_rows):,} of {total_rows:,}')
 
     # --- Styling
     # We can use CSS code to hide the hamburger icon, the header, and the footer
@@ -180,6 +221,15 @@ def main():
 
     st.markdown(hide_st_style, unsafe_allow_html=True)  # unsafe_allow_html makes it so the CSS code is escaped
 
+    # --- Live refresh
+    # if on, wait here for the watcher to pick up new rows in the workbook, then rerun with the new data
+    # any st call raises Streamlit's stop exception if the user changed a widget meanwhile, so the page stays responsive
+    if live_refresh:
+        status = st.empty()
+        while not dataset.wait_for_change(dataset_version, timeout=1.0):
+            status.empty()
+        st.experimental_rerun()
+
     # We also created more styling by adding the .streamlit folder
     # in here, the config.toml file sets the theme (used Sublime TExt to create file)
     # we have set the primary and background and secondary background and text colors, and the font
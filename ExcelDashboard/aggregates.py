@@ -0,0 +1,154 @@
+# Aggregation of the sales data used by ExcelDashboard.py
+#
+# City, Customer_type and Gender (the sidebar filters) only have a handful of values each, as do Product line and hour
+# So rather than filtering every row and grouping them again on each rerun, we group the data once into a 'cube'
+# with one row (cell) per combination of these columns, holding the sums and counts we need
+# Any filter selection then only has to add up the matching cells, which does not depend on the number of rows
+#
+# All aggregation is done in a single pass over only the columns needed (Total, Rating and the keys):
+# the keys are turned into integer codes and the measures are summed per code with np.bincount
+# (df.groupby(...).sum() would sum every numeric column, and each KPI would be another pass over the data)
+#
+# LIBRARIES: pandas, numpy
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ['City', 'Customer_type', 'Gender', 'Product line', 'hour']
+
+
+def measure_arrays(df):
+    ''' Returns (total, total_valid, rating, rating_valid) numpy arrays of df
+    missing values are set to 0 in total and rating, and marked False in the _valid arrays
+    '''
+
+    total = df['Total'].to_numpy(dtype=float)
+    rating = df['Rating'].to_numpy(dtype=float)
+    total_valid = ~np.isnan(total)
+    rating_valid = ~np.isnan(rating)
+
+    return np.where(total_valid, total, 0.0), total_valid, np.where(rating_valid, rating, 0.0), rating_valid
+
+
+def grouped_total(keys, total, name):
+    ''' Returns a dataframe of the sum of total per value of keys, sorted ascending by 'Total'
+    keys is a pandas series of the group of each row, name is the name of the index
+    '''
+
+    codes, uniques = pd.factorize(keys)
+    valid = codes >= 0  # missing keys (code -1) are dropped, like groupby does
+    sums = np.bincount(codes[valid], weights=total[valid], minlength=len(uniques))
+
+    grouped = pd.DataFrame({'Total': sums}, index=pd.Index(np.asarray(uniques), name=name))
+    return grouped.sort_values(by='Total')
+
+
+def selection_summary(total, count, rating_sum, rating_count, sales_by_product_line, sales_by_hour):
+    ''' Returns the dict of KPI's and chart data shown by the dashboard
+    '''
+
+    return {
+        'total_sales': total,
+        'average_rating': rating_sum / rating_count if rating_count else float('nan'),
+        'average_sale': total / count if count else float('nan'),
+        'transactions': count,
+        'sales_by_product_line': sales_by_product_line,
+        'sales_by_hour': sales_by_hour
+        }
+
+
+def aggregate_rows(df):
+    ''' Returns the dict of KPI's and chart data of all rows of df, in one pass over Total, Rating and the keys
+    '''
+
+    total, total_valid, rating, rating_valid = measure_arrays(df)
+
+    return selection_summary(
+        total.sum(),
+        int(total_valid.sum()),
+        rating.sum(),
+        int(rating_valid.sum()),
+        grouped_total(df['Product line'], total, 'Product line'),
+        grouped_total(df['hour'], total, 'hour')
+        )
+
+
+def cube_cells(df):
+    ''' Returns (cells, cell_of_row, valid) for the combinations of CUBE_DIMENSIONS in df
+    cells is a dataframe of the dimensions, one row per combination found in the data
+    cell_of_row is the cell (row of cells) of each valid row of df, rows with a missing dimension are not valid
+    '''
+
+    # combine the integer codes of every dimension into one key per row (mixed radix, like digits of a number)
+    key = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    dimension_uniques = []
+    for column in CUBE_DIMENSIONS:
+        codes, uniques = pd.factorize(df[column])
+        valid &= codes >= 0
+        key = key * len(uniques) + codes
+        dimension_uniques.append(uniques)
+
+    # number the keys that occur
+    cell_of_row, cell_keys = pd.factorize(key[valid])
+
+    # decode the cell keys back into the values of each dimension (the last dimension is the lowest 'digit')
+    values = {}
+    remaining = np.asarray(cell_keys)
+    for column, uniques in reversed(list(zip(CUBE_DIMENSIONS, dimension_uniques))):
+        remaining, codes = np.divmod(remaining, len(uniques))
+        values[column] = uniques.take(codes)
+
+    cells = pd.DataFrame({column: values[column] for column in CUBE_DIMENSIONS})
+    return cells, cell_of_row, valid
+
+
+def build_sales_cube(df):
+    ''' Returns the cube dataframe of df, one row per combination of CUBE_DIMENSIONS found in the data
+    with the measures total (sum of Total), count (number of Totals), rating_sum and rating_count
+    '''
+
+    cube, cell_of_row, valid = cube_cells(df)
+    cells = len(cube)
+
+    # sum every measure per cell with one bincount each
+    total, total_valid, rating, rating_valid = (measure[valid] for measure in measure_arrays(df))
+
+    cube['total'] = np.bincount(cell_of_row, weights=total, minlength=cells)
+    cube['count'] = np.bincount(cell_of_row, weights=total_valid, minlength=cells).astype(np.int64)
+    cube['rating_sum'] = np.bincount(cell_of_row, weights=rating, minlength=cells)
+    cube['rating_count'] = np.bincount(cell_of_row, weights=rating_valid, minlength=cells).astype(np.int64)
+
+    return cube
+
+
+def merge_cubes(cube, other):
+    ''' Returns the cube of the rows of both cubes (i.e. the cube of old rows merged with the cube of new rows)
+    '''
+
+    merged = pd.concat([cube, other], ignore_index=True)
+    merged = merged.groupby(CUBE_DIMENSIONS, sort=False, observed=True)[['total', 'count', 'rating_sum', 'rating_count']].sum()
+
+    return merged.reset_index()
+
+
+def query_cube(cube, selections):
+    ''' Returns a dict of the KPI's and chart data for the selected filters
+    selections is a dict of {column: list of selected values}, the columns must be in CUBE_DIMENSIONS
+    '''
+
+    keep = np.ones(len(cube), dtype=bool)
+    for column, values in selections.items():
+        keep &= cube[column].isin(values).to_numpy()
+    cells = cube[keep]
+
+    # the same as summing/averaging over the selected rows, sorted ascending like the charts expect
+    total = cells['total'].to_numpy()
+    return selection_summary(
+        total.sum(),
+        int(cells['count'].sum()),
+        cells['rating_sum'].sum(),
+        int(cells['rating_count'].sum()),
+        grouped_total(cells['Product line'], total, 'Product line'),
+        grouped_total(cells['hour'], total, 'hour')
+        )
@@ -0,0 +1,162 @@
+# A small HTTP/JSON server of the dashboard's numbers, without streamlit
+#
+# Serves the KPI's and chart data of ExcelDashboard.py for a filter selection (see dashboard_core.py)
+# so embedded dashboards and scheduled reports do not each need a streamlit session
+# Responses are cached per data version and selection, and carry an ETag so clients can revalidate with If-None-Match
+#
+#   GET /filters                                         the filter columns, their values, and the date range
+#   GET /summary?City=Yangon&City=Mandalay&start=2021-01-01&end=2021-01-31
+#       a filter column that is not given selects all its values, start and end (both included) are optional
+#
+# run from the ExcelDashboard folder: 'python api.py --port 8502'
+#
+# LIBRARIES: pandas, numpy, openpyxl, pyarrow
+
+import argparse
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dashboard_core import SALES_WORKBOOKS, compute_selection, filter_options, selection_payload
+from figure_cache import selection_key
+from sales_dataset import SalesDataset
+
+MAX_CACHED_RESPONSES = 1024
+
+
+class ResponseCache:
+    ''' Least-recently-used cache of json responses, {key: (body bytes, etag)}
+    '''
+
+    def __init__(self, max_entries=MAX_CACHED_RESPONSES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        ''' Returns the (body, etag) stored for key, or None
+        '''
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        ''' Stores entry, a (body, etag), for key, evicting the least recently used entries over max_entries
+        '''
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def parse_date(text):
+    ''' Returns the datetime.date of an ISO date string (i.e. '2021-01-31'), or None if text is None
+    '''
+
+    return datetime.date.fromisoformat(text) if text is not None else None
+
+
+def json_response(payload):
+    ''' Returns (body bytes, etag) of the payload, the etag is a hash of the body
+    '''
+
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    ''' Handles the GET requests, the dataset and cache are set on the server (see make_server)
+    '''
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        snapshot = self.server.dataset.snapshot()
+        df, _, _, time_index, version = snapshot
+
+        try:
+            if url.path == '/filters':
+                key = (version, 'filters')
+                entry = self.server.cache.get(key)
+                if entry is None:
+                    bounds = time_index.date_bounds()
+                    entry = json_response({
+                        'filters': {column: [str(value) for value in values] for column, values in filter_options(df).items()},
+                        'dates': [str(bounds[0]), str(bounds[1])] if bounds is not None else None,
+                        'version': version
+                        })
+                    self.server.cache.put(key, entry)
+
+            elif url.path == '/summary':
+                options = filter_options(df)
+                selections = {column: query.get(column, values) for column, values in options.items()}
+                start_date = parse_date(query.get('start', [None])[0])
+                end_date = parse_date(query.get('end', [None])[0])
+
+                key = selection_key(dict(selections, Date=[str(start_date), str(end_date)]), version)
+                entry = self.server.cache.get(key)
+                if entry is None:
+                    selection, _ = compute_selection(snapshot, selections, start_date, end_date, with_rows=False)
+                    entry = json_response(dict(selection_payload(selection), version=version))
+                    self.server.cache.put(key, entry)
+
+            else:
+                self.send_error(404, 'Unknown path, use /filters or /summary')
+                return
+        except ValueError as error:  # i.e. a badly formatted date
+            self.send_error(400, str(error))
+            return
+
+        body, etag = entry
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')  # clients may keep the response, but must revalidate it
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host, port, dataset):
+    ''' Returns the HTTP server of the dataset (a SalesDataset), serving on host and port
+    '''
+
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    server.dataset = dataset
+    server.cache = ResponseCache()
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP/JSON server of the sales dashboard numbers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--workbooks', default=SALES_WORKBOOKS, help='workbook, folder of workbooks, or glob pattern')
+    args = parser.parse_args()
+
+    dataset = SalesDataset(args.workbooks, sheet_names=('Sales',))
+    dataset.start_watching()
+
+    server = make_server(args.host, args.port, dataset)
+    print(f'Serving on http://{args.host}:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Benchmark of the dashboard's aggregation stage
+#
+# Compares the original code path (df.query, two full groupby(...).sum() and three KPI reductions)
+# against the single-pass aggregation (aggregate_rows) and the pre-aggregated cube (query_cube) in aggregates.py
+# The bundled workbook is resampled to larger row counts, so the scaling can be seen
+#
+# run from the ExcelDashboard folder: 'python benchmarks/bench_aggregation.py'
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so the dashboard modules can be imported
+
+from aggregates import aggregate_rows, build_sales_cube, query_cube
+from data_loader import load_sales_data
+from filter_index import BitmapIndex, categorize
+
+ROW_COUNTS = [1000, 100000, 1000000]
+REPEATS = 5
+
+CITY = ['Yangon', 'Mandalay']
+CUSTOMER_TYPE = ['Member']
+GENDER = ['Female', 'Male']
+
+
+def original_path(df):
+    ''' The aggregation as ExcelDashboard.main() used to do it
+    '''
+
+    df_selection = df.query('City == @CITY & Customer_type == @CUSTOMER_TYPE & Gender == @GENDER')
+
+    total_sales = df_selection['Total'].sum()
+    average_rating = df_selection['Rating'].mean()
+    average_sale = df_selection['Total'].mean()
+
+    sales_by_product_line = df_selection.groupby(by=['Product line']).sum(numeric_only=True)
+    sales_by_product_line = sales_by_product_line[['Total']].sort_values(by='Total')
+    sales_by_hour = df_selection.groupby(by=['hour']).sum(numeric_only=True)
+    sales_by_hour = sales_by_hour[['Total']].sort_values(by='Total')
+
+    return total_sales, average_rating, average_sale, sales_by_product_line, sales_by_hour
+
+
+def best_time(function):
+    ''' Returns the best time in seconds of REPEATS calls of function
+    '''
+
+    return min(timeit.repeat(function, number=1, repeat=REPEATS))
+
+
+def main():
+    base = load_sales_data(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'supermarkt_sales.xlsx'))
+    rng = np.random.default_rng(0)
+
+    selections = {'City': CITY, 'Customer_type': CUSTOMER_TYPE, 'Gender': GENDER}
+
+    print(f'{"rows":>10} {"original":>12} {"single pass":>12} {"cube":>12} {"speedup":>10} {"cube build":>12}')
+    for rows in ROW_COUNTS:
+        raw = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)  # resample rows of the workbook
+        df = categorize(raw.copy())  # the dashboard's own data is categorical, the original path ran on text columns
+        index = BitmapIndex(df)
+        cube = build_sales_cube(df)
+
+        original = best_time(lambda: original_path(raw))
+        single_pass = best_time(lambda: aggregate_rows(df[index.mask(selections)]))
+        cube_query = best_time(lambda: query_cube(cube, selections))
+        cube_build = best_time(lambda: build_sales_cube(df))
+
+        print(f'{rows:>10,} {original * 1000:>10.2f}ms {single_pass * 1000:>10.2f}ms {cube_query * 1000:>10.2f}ms '
+              f'{original / single_pass:>9.1f}x {cube_build * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# Scaling benchmark of the ExcelDashboard data path
+#
+# For each number of rows, synthetic workbooks are generated (see synthetic_workbook.py, kept between runs)
+# and every stage of the dashboard is timed on its own: loading the workbook (parsing, and from the cache),
+# deriving the 'hour' column, filtering, grouping, the KPI reductions and building the figures
+# Both the original code path (df.query, groupby(...).sum()) and the current one (bitmap index, cube) are timed
+#
+# The results are written as json, and can be compared against an earlier run to catch regressions:
+# 'python benchmarks/bench_scaling.py --sizes 1000 100000 --output new.json --compare old.json'
+# run from the ExcelDashboard folder, the exit code is 1 if any stage got slower than --tolerance allows
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so the dashboard modules can be imported
+
+from aggregates import aggregate_rows, build_sales_cube, query_cube
+from data_loader import CACHE_DIR, add_hour_column, load_sales_sources, read_workbook
+from filter_index import BitmapIndex, categorize
+from synthetic_workbook import generate
+
+SIZES = [1000, 10000, 100000, 1000000, 10000000]
+REPEATS = 3  # the in-memory stages are quick, so they are timed a few times to even out noise
+WORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+CITY = ['Yangon', 'Mandalay']
+CUSTOMER_TYPE = ['Member']
+GENDER = ['Female', 'Male']
+SELECTIONS = {'City': CITY, 'Customer_type': CUSTOMER_TYPE, 'Gender': GENDER}
+
+
+def timed(function, repeat=REPEATS):
+    ''' Returns (result, seconds) of calling function, the best time of repeat calls
+    '''
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return result, best
+
+
+def build_figures(sales_by_product_line, sales_by_hour):
+    ''' Builds the two bar charts as ExcelDashboard.main() does
+    '''
+
+    fig_product_sales = px.bar(
+        sales_by_product_line, x='Total', y=sales_by_product_line.index, orientation='h',
+        title='<b>Sales by Product Line</b>', color_discrete_sequence=['#0083B8'] * len(sales_by_product_line),
+        template='plotly_white'
+        )
+    fig_product_sales.update_layout(plot_bgcolor='rgba(0, 0, 0, 0)', xaxis=dict(showgrid=False))
+
+    fig_hourly_sales = px.bar(
+        sales_by_hour, x=sales_by_hour.index, y='Total',
+        title='<b>Sales by Hour</b>', color_discrete_sequence=['#0083B8'] * len(sales_by_hour),
+        template='plotly_white'
+        )
+    fig_hourly_sales.update_layout(
+        plot_bgcolor='rgba(0, 0, 0, 0)', xaxis=dict(tickmode='linear'), yaxis=dict(showgrid=False)
+        )
+
+    return fig_product_sales, fig_hourly_sales
+
+
+def workbooks_for(rows):
+    ''' Returns the folder of synthetic workbooks with rows rows, generating them the first time
+    '''
+
+    folder = os.path.join(WORK_DIR, f'rows_{rows}')
+    done_marker = os.path.join(folder, 'done')
+
+    if not os.path.exists(done_marker):
+        shutil.rmtree(folder, ignore_errors=True)
+        generate(rows, folder)
+        open(done_marker, 'w').close()
+
+    return folder
+
+
+def bench_size(rows):
+    ''' Returns the dict of {stage: seconds} for the data path on rows rows
+    '''
+
+    folder = workbooks_for(rows)
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.xlsx'))
+    stages = {}
+
+    # - Loading
+    shutil.rmtree(os.path.join(folder, CACHE_DIR), ignore_errors=True)
+    _, stages['workbook_parse'] = timed(lambda: [read_workbook(path) for path in paths], repeat=1)
+    _, stages['workbook_load_parallel'] = timed(lambda: load_sales_sources(folder), repeat=1)  # parses and writes the caches
+    raw, stages['cache_load'] = timed(lambda: load_sales_sources(folder))
+    _, stages['hour_derivation'] = timed(lambda: add_hour_column(raw[['Time']].copy()))
+
+    # - Original path
+    df_selection, stages['query_filter'] = timed(lambda: raw.query(
+        'City == @CITY & Customer_type == @CUSTOMER_TYPE & Gender == @GENDER'
+        ))
+
+    def groupbys():
+        by_product_line = df_selection.groupby(by=['Product line']).sum(numeric_only=True)[['Total']].sort_values(by='Total')
+        by_hour = df_selection.groupby(by=['hour']).sum(numeric_only=True)[['Total']].sort_values(by='Total')
+        return by_product_line, by_hour
+
+    (sales_by_product_line, sales_by_hour), stages['groupbys'] = timed(groupbys)
+    _, stages['kpi_reductions'] = timed(lambda: (
+        df_selection['Total'].sum(), df_selection['Rating'].mean(), df_selection['Total'].mean()
+        ))
+    _, stages['figure_construction'] = timed(lambda: build_figures(sales_by_product_line, sales_by_hour))
+
+    # - Current path
+    df, stages['categorize'] = timed(lambda: categorize(raw.copy()))
+    index, stages['bitmap_index_build'] = timed(lambda: BitmapIndex(df))
+    cube, stages['cube_build'] = timed(lambda: build_sales_cube(df))
+    positions, stages['bitmap_filter'] = timed(lambda: np.flatnonzero(index.mask(SELECTIONS)))
+    _, stages['single_pass_aggregation'] = timed(lambda: aggregate_rows(df.iloc[positions]))
+    _, stages['cube_query'] = timed(lambda: query_cube(cube, SELECTIONS))
+
+    return stages
+
+
+def compare(results, previous_path, tolerance):
+    ''' Prints the change of every stage against the results in previous_path, returns True if none regressed
+    a stage regressed if it is more than tolerance (a fraction) slower, stages under a millisecond are ignored
+    '''
+
+    with open(previous_path, 'r') as file:
+        previous = {run['rows']: run['stages'] for run in json.load(file)['results']}
+
+    ok = True
+    for run in results:
+        for stage, seconds in run['stages'].items():
+            before = previous.get(run['rows'], {}).get(stage)
+            if before is None:
+                continue
+
+            regressed = seconds > before * (1 + tolerance) and seconds > 1e-3
+            ok &= not regressed
+            print(f'{run["rows"]:>10,} {stage:<26} {before:>10.4f}s -> {seconds:>10.4f}s'
+                  f'{"  REGRESSION" if regressed else ""}')
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling benchmark of the ExcelDashboard data path')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of rows to benchmark')
+    parser.add_argument('--output', default='bench_scaling.json', help='json file to write the results to')
+    parser.add_argument('--compare', help='json file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a stage counts as a regression')
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.sizes:
+        stages = bench_size(rows)
+        results.append({'rows': rows, 'stages': stages})
+        print(f'{rows:,} rows: ' + ', '.join(f'{stage} {seconds:.4f}s' for stage, seconds in stages.items()))
+
+    with open(args.output, 'w') as file:
+        json.dump({
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'results': results
+            }, file, indent=2)
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Generator of synthetic sales workbooks, with the same layout as supermarkt_sales.xlsx
+#
+# A 'Sales' sheet with a title and the header in the first rows, and the data in columns B to R
+# the values are random, but drawn from the same ranges and categories as the supplied workbook
+# An Excel sheet holds at most 1,048,576 rows, so larger data is split over several workbooks in one folder
+# (the dashboard can load a folder of workbooks, see SALES_WORKBOOKS in ExcelDashboard.py)
+#
+# run from the ExcelDashboard folder: 'python benchmarks/synthetic_workbook.py 100000 sales_100k'
+
+import datetime
+import os
+import sys
+
+import numpy as np
+import openpyxl
+
+MAX_SHEET_ROWS = 1048576 - 4  # rows of data that fit in a sheet below the title and header
+
+HEADER = [
+    'Invoice ID', 'Branch', 'City', 'Customer_type', 'Gender', 'Product line', 'Unit price', 'Quantity', 'Tax 5%',
+    'Total', 'Date', 'Time', 'Payment', 'cogs', 'gross margin percentage', 'gross income', 'Rating'
+    ]
+
+BRANCH_CITIES = {'A': 'Yangon', 'B': 'Mandalay', 'C': 'Naypyitaw'}
+CUSTOMER_TYPES = ['Member', 'Normal']
+GENDERS = ['Female', 'Male']
+PRODUCT_LINES = [
+    'Electronic accessories', 'Fashion accessories', 'Food and beverages',
+    'Health and beauty', 'Home and lifestyle', 'Sports and travel'
+    ]
+PAYMENTS = ['Ewallet', 'Cash', 'Credit card']
+FIRST_DATE = datetime.datetime(2021, 1, 1)
+
+
+def random_rows(rows, rng, first_invoice=0):
+    ''' Yields rows (lists of the values of columns A to R) of random sales data
+    '''
+
+    branches = rng.choice(list(BRANCH_CITIES), rows)
+    customer_types = rng.choice(CUSTOMER_TYPES, rows)
+    genders = rng.choice(GENDERS, rows)
+    product_lines = rng.choice(PRODUCT_LINES, rows)
+    payments = rng.choice(PAYMENTS, rows)
+    unit_prices = rng.uniform(10, 100, rows).round(2)
+    quantities = rng.integers(1, 11, rows)
+    days = rng.integers(0, 365, rows)
+    minutes = rng.integers(10 * 60, 21 * 60, rows)  # opening hours, 10:00 to 20:59
+    ratings = rng.uniform(4, 10, rows).round(1)
+
+    for i in range(rows):
+        cogs = float(unit_prices[i] * quantities[i])
+        tax = cogs * 0.05
+        yield [
+            None,  # column A is empty
+            f'{first_invoice + i:011d}',
+            branches[i],
+            BRANCH_CITIES[branches[i]],
+            customer_types[i],
+            genders[i],
+            product_lines[i],
+            float(unit_prices[i]),
+            int(quantities[i]),
+            tax,
+            cogs + tax,
+            FIRST_DATE + datetime.timedelta(days=int(days[i])),
+            datetime.time(int(minutes[i]) // 60, int(minutes[i]) % 60),
+            payments[i],
+            cogs,
+            4.761904762,
+            tax,
+            float(ratings[i])
+            ]
+
+
+def write_workbook(path, rows, rng, first_invoice=0):
+    ''' Writes a workbook of rows random sales rows to path, in the layout of supermarkt_sales.xlsx
+    '''
+
+    workbook = openpyxl.Workbook(write_only=True)  # write_only streams the rows to the file
+    worksheet = workbook.create_sheet('Sales')
+
+    worksheet.append([])
+    worksheet.append([None, 'Sales 2021'])
+    worksheet.append([])
+    worksheet.append([None] + HEADER)
+
+    for row in random_rows(rows, rng, first_invoice):
+        worksheet.append(row)
+
+    workbook.save(path)
+
+
+def generate(rows, folder, seed=0):
+    ''' Writes rows random sales rows as workbooks in folder (as many as needed), returns their paths
+    '''
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    paths = []
+    for part, first_row in enumerate(range(0, rows, MAX_SHEET_ROWS)):
+        path = os.path.join(folder, f'sales_{part:03d}.xlsx')
+        write_workbook(path, min(MAX_SHEET_ROWS, rows - first_row), rng, first_invoice=first_row)
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == '__main__':
+    print('\n'.join(generate(int(sys.argv[1]), sys.argv[2])))
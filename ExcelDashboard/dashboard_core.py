@@ -0,0 +1,86 @@
+# The computation behind ExcelDashboard.py, without any streamlit
+#
+# Turns a filter selection (values per column and a date range) into the KPI's and chart data of the dashboard
+# Used by the streamlit app, and by api.py which serves the same results as json over HTTP
+#
+# LIBRARIES: pandas, numpy
+
+import os
+
+import numpy as np
+
+from aggregates import CUBE_DIMENSIONS, aggregate_rows, query_cube
+
+# the workbook(s) to load, can be a single workbook, a folder of workbooks, or a glob pattern (i.e. 'sales/2022-*.xlsx')
+# set the SALES_WORKBOOKS environment variable to use other workbooks than the supplied one
+SALES_WORKBOOKS = os.environ.get('SALES_WORKBOOKS', 'supermarkt_sales.xlsx')
+
+# the sidebar filters, {column: label}
+# any text column with few values can be added here (i.e. 'Payment', 'Branch'), the filter index covers them all
+FILTERS = {
+    'City': 'Select the City:',
+    'Customer_type': 'Select the Customer Type:',
+    'Gender': 'Select the Gender:'
+    }
+
+
+def filter_options(df):
+    ''' Returns {column: list of values} of every filter in FILTERS, in the order they appear in the data
+    '''
+
+    return {column: list(df[column].unique()) for column in FILTERS}
+
+
+def compute_selection(snapshot, selections, start_date=None, end_date=None, with_rows=True):
+    ''' Returns (selection, selected_positions) for the filters
+    snapshot is SalesDataset.snapshot(), selections is {column: list of selected values}
+    start_date and end_date (both included) limit the dates, None means from the first / to the last date
+    selection is the dict of KPI's and chart data (see aggregates.selection_summary)
+    selected_positions is the numpy array of the positions of the selected rows of df, or None if with_rows is False
+    '''
+
+    df, cube, index, time_index, _ = snapshot
+
+    bounds = time_index.date_bounds()
+    if bounds is not None:
+        start_date = start_date if start_date is not None else bounds[0]
+        end_date = end_date if end_date is not None else bounds[1]
+    all_dates = bounds is None or (start_date <= bounds[0] and end_date >= bounds[1])
+
+    selected_positions = None
+    if with_rows or not set(selections) <= set(CUBE_DIMENSIONS):
+        # Get the positions of the rows matching the filters from the bitmap index, OR within a column and AND across columns
+        # the data is sorted by date, so the rows in the date range are one slice, found by binary search (see time_index.py)
+        row_lo, row_hi = time_index.row_range(start_date, end_date) if not all_dates else (0, len(df))
+        selected_positions = np.flatnonzero(index.mask(selections)[row_lo:row_hi]) + row_lo
+
+    # Sum the matching cells of the cube for the KPI's and chart data
+    # for part of the dates, the cube of the date range comes from the daily cumulative cubes of the time index
+    # if filtering on a column the cube does not have, the selected rows are aggregated directly (in a single pass)
+    if set(selections) <= set(CUBE_DIMENSIONS):
+        selection = query_cube(cube if all_dates else time_index.range_cube(start_date, end_date), selections)
+    else:
+        selection = aggregate_rows(df.iloc[selected_positions])
+
+    return selection, selected_positions
+
+
+def selection_payload(selection):
+    ''' Returns the selection (see compute_selection) as a dict of plain python values, ready for json
+    '''
+
+    def series(grouped):
+        return [{'key': key.item() if hasattr(key, 'item') else key, 'total': float(total)}
+                for key, total in grouped['Total'].items()]
+
+    def number(value):
+        return None if value != value else float(value)  # NaN (no rows) becomes null
+
+    return {
+        'total_sales': float(selection['total_sales']),
+        'average_rating': number(selection['average_rating']),
+        'average_sale': number(selection['average_sale']),
+        'transactions': int(selection['transactions']),
+        'sales_by_product_line': series(selection['sales_by_product_line']),
+        'sales_by_hour': series(selection['sales_by_hour'])
+        }
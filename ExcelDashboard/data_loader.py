@@ -0,0 +1,564 @@
+# Loading of the sales workbook used by ExcelDashboard.py
+#
+# Parsing an xlsx file with openpyxl is slow (every cell is read out of XML), so the parsed dataframe is
+# stored in a sidecar cache next to the workbook, as an uncompressed Feather (Arrow IPC) file
+# Later loads memory-map this file instead of touching openpyxl, and the cache is rebuilt automatically
+# whenever the workbook changes (different size, modification time, and content hash)
+#
+# The workbook itself is read with openpyxl's read-only (streaming) worksheet, in chunks of rows
+# so the whole sheet is never held as an XML tree in memory, and there is no cap on the number of rows
+#
+# The sales workbook is only ever appended to during the day, so when it changes we first try to read just the new rows:
+# the manifest stores the number of rows, a checksum of the last few rows and one of all the rows above them
+# if both are unchanged only the rows after them are typed and stored (as another part of the cache), otherwise
+# (i.e. a cell above the new rows was edited in the same save) the whole sheet is read again, as it also is when the
+# content changed but no rows were added
+# openpyxl has to scan the sheet's XML up to the new rows anyway, so the rows above them are hashed as they are
+# scanned, as text (about a seventh more than the scan, i.e. 100k rows: 17.7s scanned, 20.1s hashed, 21.0s parsed)
+# so an append is not much quicker to read than the whole sheet, the saving is in not rewriting the cache
+# and in adding only the new rows to the dashboard's data and indexes (see sales_dataset.py)
+#
+# The data can also come from many workbooks (i.e. one per branch and month) and many sheets in each
+# every (workbook, sheet) has its own cache, and the ones that changed are parsed in parallel in a process pool
+# (parsing is CPU bound python code, so threads would not help because of the GIL)
+#
+# LIBRARIES: pandas, openpyxl, pyarrow (optional, without it the workbook is always parsed)
+
+import collections
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # no pyarrow, so no cache - we simply parse the workbook every time
+    feather = None
+
+CACHE_DIR = '.sales_cache'  # folder (next to the workbook) holding the cached data
+CACHE_FORMAT_VERSION = 5  # bump this if the layout of the cached dataframe changes
+MAX_CACHE_PARTS = 16  # appended parts of the cache before they are merged back into one file
+TAIL_ROWS = 5  # last rows of the sheet checked to make sure the workbook was only appended to
+
+# layout of the sales sheet: 3 rows of title above the header, data in columns B to R
+HEADER_ROW = 4
+FIRST_COLUMN = 2  # B
+LAST_COLUMN = 18  # R
+CHUNK_SIZE = 50000  # rows parsed before they are turned into a typed dataframe chunk
+
+# the types of the known columns, anything else is inferred by pandas
+SALES_COLUMN_TYPES = {
+    'Unit price': 'float64',
+    'Quantity': 'int64',
+    'Tax 5%': 'float64',
+    'Total': 'float64',
+    'Date': 'datetime64[ns]',
+    'cogs': 'float64',
+    'gross margin percentage': 'float64',
+    'gross income': 'float64',
+    'Rating': 'float64'
+    }
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(path, block_size=1 << 20):
+    ''' Returns the sha256 hex-digest of the file at path
+    the file is read in blocks so large workbooks are not loaded into memory at once
+    '''
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def workbook_signature(path, content_hash=None):
+    ''' Returns a dict describing the workbook at path (path, size, mtime and content hash)
+    if content_hash is None it is computed from the file
+    '''
+
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': content_hash if content_hash is not None else file_hash(path),
+        'version': CACHE_FORMAT_VERSION
+        }
+
+
+def cache_paths(path, sheet_name):
+    ''' Returns the (folder, file name stem, manifest path) of the cache for this workbook and sheet
+    '''
+
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    stem = f'{os.path.splitext(os.path.basename(path))[0]}.{sheet_name}'
+
+    return folder, stem, os.path.join(folder, stem + '.json')
+
+
+def read_manifest(manifest_path):
+    ''' Returns the stored manifest dict, or None if it is missing or unreadable
+    '''
+
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(manifest_path, manifest):
+    ''' Writes the manifest dict as json, replacing the old file in one step
+    '''
+
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def add_hour_column(df):
+    ''' Adds the 'hour' column (time of day in hours) derived from the 'Time' column
+    df must have a 'Time' column of times in format hours:minutes:seconds
+    '''
+
+    # by default, it is not in this format (its in 24hr digital)
+    # we must create the 'hour' column to be in this format
+    df['hour'] = pd.to_datetime(df['Time'].astype(str), format='%H:%M:%S').dt.hour  # dt is datetime
+
+    return df
+
+
+def add_datetime_column(df):
+    ''' Adds the 'Datetime' column, the 'Date' and 'Time' columns combined (used to filter by date range)
+    '''
+
+    df['Datetime'] = df['Date'] + pd.to_timedelta(df['Time'].astype(str))
+
+    return df
+
+
+def typed_chunk(rows, columns):
+    ''' Returns a dataframe of the rows (list of tuples) with the known sales column types applied
+    '''
+
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    types = {column: dtype for column, dtype in SALES_COLUMN_TYPES.items() if column in chunk.columns}
+
+    return chunk.astype(types)
+
+
+def rows_checksum(df):
+    ''' Returns the sha256 hex-digest of the values of the rows of df (used on a few rows only)
+    the values are compared as text, so it does not depend on the dtypes pandas chose
+    '''
+
+    text = '\n'.join('\x1f'.join(str(value) for value in row) for row in df.itertuples(index=False))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HeadHash:
+    ''' The sha256 of the rows of a sheet above its last TAIL_ROWS rows (the rows above the tail, see tail_manifest)
+    the rows are added as openpyxl reads them, tuples of values, and hashed as text like rows_checksum
+    '''
+
+    def __init__(self):
+        self.sha = hashlib.sha256()
+        self.last_rows = collections.deque()  # the last TAIL_ROWS rows added, not hashed yet
+        self.before_start = None  # the hexdigest of all the rows above start_row (see iter_sheet_chunks)
+
+    @staticmethod
+    def row_bytes(row):
+        return ('\x1f'.join(str(value) for value in row) + '\n').encode('utf-8')
+
+    def add(self, row):
+        self.last_rows.append(row)
+        if len(self.last_rows) > TAIL_ROWS:
+            self.sha.update(self.row_bytes(self.last_rows.popleft()))
+
+    def all_rows_hexdigest(self):
+        ''' Returns the hexdigest of every row added so far, the last TAIL_ROWS included
+        '''
+
+        sha = self.sha.copy()
+        for row in self.last_rows:
+            sha.update(self.row_bytes(row))
+
+        return sha.hexdigest()
+
+    def hexdigest(self):
+        return self.sha.hexdigest()
+
+
+def iter_sheet_chunks(path, sheet_name='Sales', chunk_size=CHUNK_SIZE, header_row=HEADER_ROW,
+                      first_column=FIRST_COLUMN, last_column=LAST_COLUMN, start_row=None, head=None):
+    ''' Yields (chunk, row_numbers) of at most chunk_size rows from the sheet, using the streaming worksheet
+    chunk is a typed dataframe and row_numbers the list of (1-indexed) sheet rows its rows came from
+    start_row is the first sheet row of data to read, by default the row below the header
+    head is a HeadHash every row is added to, the rows above start_row too (they are hashed, not typed), if given
+    '''
+
+    # read_only streams rows straight out of the file instead of building the whole workbook in memory
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+
+        header = next(worksheet.iter_rows(
+            min_row=header_row, max_row=header_row,
+            min_col=first_column, max_col=last_column,
+            values_only=True
+            ))
+        columns = [column for column in header if column is not None]  # drop unnamed trailing columns
+        width = len(columns)
+
+        first_row = start_row if start_row is not None else header_row + 1
+        scan_row = header_row + 1 if head is not None else first_row  # openpyxl parses the rows above anyway
+        rows = []
+        row_numbers = []
+        chunks_yielded = 0
+        for row_number, row in enumerate(worksheet.iter_rows(
+                min_row=scan_row,
+                min_col=first_column, max_col=first_column + width - 1,
+                values_only=True), start=scan_row):
+            if all(value is None for value in row):  # skip blank rows (usually formatting at the end of the sheet)
+                continue
+
+            if head is not None:
+                if row_number >= first_row and head.before_start is None:
+                    head.before_start = head.all_rows_hexdigest()
+                head.add(row)
+                if row_number < first_row:
+                    continue
+
+            rows.append(row)
+            row_numbers.append(row_number)
+            if len(rows) >= chunk_size:
+                yield typed_chunk(rows, columns), row_numbers
+                chunks_yielded += 1
+                rows = []
+                row_numbers = []
+
+        if rows or not chunks_yielded:
+            yield typed_chunk(rows, columns), row_numbers  # last chunk, may be empty so the columns are always known
+    finally:
+        workbook.close()  # read-only workbooks keep the file open until closed
+
+
+def read_sheet_rows(path, sheet_name='Sales', chunk_size=CHUNK_SIZE, on_progress=None, start_row=None, head=None):
+    ''' Parses the sales sheet in chunks from start_row (see iter_sheet_chunks), with the 'hour' and 'Datetime' columns
+    returns (df, tail_row_numbers), the sheet rows of the last TAIL_ROWS rows of df
+    head is a HeadHash of the sheet's rows (see iter_sheet_chunks), if given
+    on_progress is called as on_progress(rows, rows_per_second) after each chunk, if given
+    '''
+
+    start = time.perf_counter()
+    chunks = []
+    tail_row_numbers = []
+    rows = 0
+
+    for chunk, row_numbers in iter_sheet_chunks(path, sheet_name, chunk_size=chunk_size, start_row=start_row, head=head):
+        # derive the hour and datetime per chunk, so no full-size temporaries are needed
+        chunks.append(add_datetime_column(add_hour_column(chunk)))
+        tail_row_numbers = (tail_row_numbers + row_numbers)[-TAIL_ROWS:]
+        rows += len(chunk)
+
+        if on_progress is not None:
+            on_progress(rows, rows / max(time.perf_counter() - start, 1e-9))
+
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+    seconds = time.perf_counter() - start
+    logger.info('Read %d rows from %s in %.2fs (%.0f rows/s)', rows, path, seconds, rows / max(seconds, 1e-9))
+
+    return df, tail_row_numbers
+
+
+def read_workbook(path, sheet_name='Sales', chunk_size=CHUNK_SIZE, on_progress=None):
+    ''' Parses the sales sheet of the workbook in chunks, returns the dataframe with the 'hour' and 'Datetime' columns
+    on_progress is called as on_progress(rows, rows_per_second) after each chunk, if given
+    '''
+
+    return read_sheet_rows(path, sheet_name, chunk_size, on_progress)[0]
+
+
+def write_cache_part(folder, file_name, df):
+    ''' Writes df to the cache folder as an uncompressed feather file (so it can be memory-mapped)
+    '''
+
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, file_name + '.tmp')
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, os.path.join(folder, file_name))
+
+
+def remove_cache_parts(folder, stem):
+    ''' Deletes the appended parts of the cache (after the whole sheet was written as one file)
+    '''
+
+    for file_name in os.listdir(folder):
+        if file_name.startswith(stem + '.part'):
+            os.remove(os.path.join(folder, file_name))
+
+
+def read_cache(folder, manifest):
+    ''' Returns the cached dataframe, the memory-mapped parts listed in the manifest joined together
+    '''
+
+    parts = [
+        feather.read_table(os.path.join(folder, file_name), memory_map=True).to_pandas()
+        for file_name in manifest['parts']
+        ]
+
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+def cached_rows(folder, manifest):
+    ''' Returns the number of rows in the parts of the cache, from their memory-mapped headers (no data is read)
+    '''
+
+    return sum(feather.read_table(os.path.join(folder, file_name), memory_map=True).num_rows
+               for file_name in manifest['parts'])
+
+
+def cache_is_valid(folder, manifest):
+    ''' Returns True if the manifest is of this cache format, all its parts exist and they hold the rows it lists
+    '''
+
+    return manifest is not None \
+        and manifest.get('version') == CACHE_FORMAT_VERSION \
+        and all(os.path.exists(os.path.join(folder, file_name)) for file_name in manifest['parts']) \
+        and cached_rows(folder, manifest) == manifest.get('rows')
+
+
+def tail_manifest(df, tail_row_numbers, head):
+    ''' Returns the part of the manifest used to detect appended rows: where the last rows are, their checksum
+    and the checksum of the rows above them (the HeadHash of the sheet, as it was read)
+    df must be the rows that were read last (so its last rows are the rows at tail_row_numbers)
+    '''
+
+    return {
+        'tail_row': tail_row_numbers[0] if tail_row_numbers else None,
+        'tail_rows': len(tail_row_numbers),
+        'tail_checksum': rows_checksum(df.tail(len(tail_row_numbers))) if tail_row_numbers else None,
+        'head_checksum': head.hexdigest()
+        }
+
+
+def read_appended_rows(path, sheet_name, manifest):
+    ''' Returns (new_rows, tail) if the workbook was only appended to since the manifest was written
+    new_rows is the dataframe of the rows after the stored tail, tail the new tail_manifest
+    returns None if the stored last rows, or any row above them, changed (so the whole sheet has to be read)
+    '''
+
+    if manifest.get('tail_row') is None:
+        return None
+
+    head = HeadHash()
+    rows, tail_row_numbers = read_sheet_rows(path, sheet_name, start_row=manifest['tail_row'], head=head)
+    overlap = manifest['tail_rows']
+
+    if head.before_start != manifest['head_checksum']:  # a row above the tail was edited
+        return None
+    if len(rows) < overlap or rows_checksum(rows.iloc[:overlap]) != manifest['tail_checksum']:
+        return None
+
+    return rows.iloc[overlap:].reset_index(drop=True), tail_manifest(rows, tail_row_numbers, head)
+
+
+def update_sales_data(path='supermarkt_sales.xlsx', sheet_name='Sales', with_frame=True):
+    ''' Returns (df, new_rows, status) for the workbook, bringing the sidecar cache up to date
+    status is 'cached' if the cache was still valid, 'appended' if only new rows were read
+    (new_rows is then the dataframe of those rows, the last rows of df) or 'parsed' if the whole sheet was read
+    with_frame=False is for callers that already have the older rows: df is then None unless the sheet was parsed
+    so the cache is not read back, and an append takes time in proportion to the new rows
+    '''
+
+    if feather is None:
+        return read_workbook(path, sheet_name), None, 'parsed'
+
+    folder, stem, manifest_path = cache_paths(path, sheet_name)
+    manifest = read_manifest(manifest_path)
+    stat = os.stat(path)
+
+    if cache_is_valid(folder, manifest):
+        # cheap check first: same size and modification time means the same file, no need to hash it
+        if manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns:
+            return (read_cache(folder, manifest) if with_frame else None), None, 'cached'
+
+        # the file was touched (or copied), only re-parse if the content actually changed
+        content_hash = file_hash(path)
+        if manifest['size'] == stat.st_size and manifest['sha256'] == content_hash:
+            manifest.update(workbook_signature(path, content_hash))
+            write_manifest(manifest_path, manifest)
+            return (read_cache(folder, manifest) if with_frame else None), None, 'cached'
+
+        # the workbook changed, see if rows were only added to the end of it
+        # if the content changed but no rows were added, rows above the checked tail were edited in place
+        appended = read_appended_rows(path, sheet_name, manifest)
+        if appended is not None and len(appended[0]):
+            new_rows, tail = appended
+            df = None
+
+            if len(manifest['parts']) >= MAX_CACHE_PARTS:
+                # too many small parts, merge them back into one file
+                df = pd.concat([read_cache(folder, manifest), new_rows], ignore_index=True)
+                write_cache_part(folder, stem + '.feather', df)
+                remove_cache_parts(folder, stem)
+                manifest['parts'] = [stem + '.feather']
+            else:
+                part_name = f'{stem}.part{len(manifest["parts"])}.feather'
+                write_cache_part(folder, part_name, new_rows)
+                manifest['parts'].append(part_name)
+
+            manifest.update(workbook_signature(path, content_hash))
+            manifest.update(tail)
+            manifest['rows'] += len(new_rows)
+            write_manifest(manifest_path, manifest)
+
+            if with_frame and df is None:
+                df = read_cache(folder, manifest)
+
+            return df, new_rows, 'appended'
+
+    # cache is missing or stale, parse the workbook and store it
+    signature = workbook_signature(path)
+    head = HeadHash()
+    df, tail_row_numbers = read_sheet_rows(path, sheet_name, head=head)
+
+    write_cache_part(folder, stem + '.feather', df)
+    remove_cache_parts(folder, stem)
+    manifest = dict(signature, parts=[stem + '.feather'], rows=len(df), **tail_manifest(df, tail_row_numbers, head))
+    write_manifest(manifest_path, manifest)
+
+    return df, None, 'parsed'
+
+
+def load_sales_data(path='supermarkt_sales.xlsx', sheet_name='Sales'):
+    ''' Returns the sales dataframe, from the sidecar cache if it is still valid
+    otherwise the new rows (or the whole workbook) are parsed and the cache is updated
+    '''
+
+    return update_sales_data(path, sheet_name)[0]
+
+
+def find_workbooks(source):
+    ''' Returns the sorted list of workbook paths of source
+    source is a workbook path, a folder (all .xlsx files in it) or a glob pattern (i.e. 'sales/*/2022-*.xlsx')
+    '''
+
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '*.xlsx'))
+    elif glob.has_magic(source):
+        paths = glob.glob(source)
+    else:
+        return [source]
+
+    return sorted(path for path in paths if not os.path.basename(path).startswith('~$'))  # skip Excel's lock files
+
+
+def list_sources(source, sheet_names=('Sales',)):
+    ''' Returns the list of (workbook path, sheet name) to load from source (see find_workbooks)
+    if sheet_names is None every sheet of every workbook is loaded
+    '''
+
+    sources = []
+    for path in find_workbooks(source):
+        if sheet_names is None:
+            workbook = openpyxl.load_workbook(path, read_only=True)
+            names = workbook.sheetnames
+            workbook.close()
+        else:
+            names = sheet_names
+
+        sources.extend((path, name) for name in names)
+
+    return sources
+
+
+def cache_is_fresh(path, sheet_name):
+    ''' Returns True if the cache of the sheet exists and the workbook's size and modification time did not change
+    '''
+
+    if feather is None:
+        return False
+
+    folder, _, manifest_path = cache_paths(path, sheet_name)
+    manifest = read_manifest(manifest_path)
+    stat = os.stat(path)
+
+    return cache_is_valid(folder, manifest) \
+        and manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns
+
+
+def update_cache(source, with_frame=True):
+    ''' Brings the cache of source, a (workbook path, sheet name), up to date - run in the worker processes
+    returns (df, new_rows, status) like update_sales_data, but df is None when it can be read back from the cache
+    (so the whole dataframe is not sent back from the worker process)
+    '''
+
+    df, new_rows, status = update_sales_data(*source, with_frame=with_frame and feather is None)
+    return (None if feather is not None else df), new_rows, status
+
+
+def update_sales_sources(sources, max_workers=None, with_frames=True):
+    ''' Returns a list of (df, new_rows, status) for each (workbook path, sheet name) in sources (see update_sales_data)
+    the sheets whose cache is out of date are parsed in parallel, using up to max_workers processes (default: all cores)
+    with_frames=False only gives the df of the sheets that were parsed, the new_rows of the others are enough
+    for a caller that already has their older rows (see sales_dataset.SalesDataset.refresh)
+    '''
+
+    stale = [source for source in sources if not cache_is_fresh(*source)]
+
+    if len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            updated = dict(zip(stale, pool.map(update_cache, stale, [with_frames] * len(stale))))
+    else:
+        updated = {source: update_cache(source, with_frames) for source in stale}
+
+    results = []
+    for source in sources:
+        if source in updated:
+            df, new_rows, status = updated[source]
+            if df is None and (with_frames or status == 'parsed'):
+                df = update_sales_data(*source)[0]  # memory-maps the cache that the worker just wrote
+        else:
+            df, new_rows, status = update_sales_data(*source, with_frame=with_frames)
+        results.append((df, new_rows, status))
+
+    return results
+
+
+def concat_sales_frames(frames):
+    ''' Returns the frames joined into one dataframe with the same columns and types
+    columns missing from some frames are filled with missing values
+    '''
+
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))  # union, keeping order
+    df = pd.concat([frame.reindex(columns=columns) for frame in frames], ignore_index=True)
+
+    types = {column: dtype for column, dtype in SALES_COLUMN_TYPES.items() if column in df.columns}
+    types.pop('Quantity', None)  # int64 can not hold missing values, pandas already keeps it int when none are missing
+
+    return df.astype(types)
+
+
+def load_sales_sources(source, sheet_names=('Sales',), max_workers=None):
+    ''' Returns the sales dataframe of every sheet of every workbook of source (see list_sources)
+    '''
+
+    results = update_sales_sources(list_sources(source, sheet_names), max_workers)
+
+    return concat_sales_frames([df for df, _, _ in results])
@@ -0,0 +1,96 @@
+# Cache of the built plotly figures of ExcelDashboard.py
+#
+# Building a figure with px.bar(...) and update_layout(...) is slow compared to the rest of a rerun
+# and the same filter selection is often viewed again (by the same or another user)
+# So the figures are kept in a least-recently-used cache shared by all sessions, keyed by the filter selection
+# and the version of the data, with a cap on the memory used (measured by the size of the figures' json)
+#
+# LIBRARIES: plotly
+
+import threading
+from collections import OrderedDict
+
+MAX_BYTES = 64 * 1024 * 1024  # 64MB of figure json
+
+
+def selection_key(selections, dataset_version):
+    ''' Returns a hashable key for the filter selection that does not depend on the order values were selected in
+    selections is a dict of {column: list of selected values}
+    '''
+
+    canonical = tuple(sorted(
+        (column, tuple(sorted(str(value) for value in values)))
+        for column, values in selections.items()
+        ))
+
+    return (dataset_version, canonical)
+
+
+def figure_size(figures):
+    ''' Returns the approximate memory size in bytes of the figures (tuple of plotly figures)
+    '''
+
+    return sum(len(figure.to_json()) for figure in figures)
+
+
+class FigureCache:
+    ''' Least-recently-used cache of figures, evicting the oldest entries when over max_bytes
+    safe to share between the threads of different sessions
+    '''
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # {key: (figures, size)}, the most recently used is last
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        ''' Returns the figures stored for key, or None if they are not in the cache
+        '''
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, figures):
+        ''' Stores the figures for key, evicting the least recently used entries to stay under max_bytes
+        figures that are larger than max_bytes on their own are not stored
+        '''
+
+        size = figure_size(figures)  # outside the lock, serializing is the slow part
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (figures, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        ''' Returns a dict of the entries, bytes, hits, misses and evictions of the cache
+        '''
+
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+                }
@@ -0,0 +1,145 @@
+# Bitmap index for the sidebar filters of ExcelDashboard.py
+#
+# df.query parses the expression string and compares every string in the filtered columns on each rerun
+# Instead, the low-cardinality text columns are made categorical, and for every value of every such column
+# we store a bitmap (a boolean mask of the rows having that value, packed 8 rows per byte with numpy)
+# A filter is then OR of the bitmaps of the selected values within a column, AND across the columns
+#
+# Every low-cardinality column is indexed, so filtering on another column (Payment, Branch, etc.) needs no changes here
+# When rows are appended to the data, the bitmaps are extended by the new rows only (see BitmapIndex.extended)
+#
+# LIBRARIES: pandas, numpy
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+MAX_INDEX_VALUES = 64  # columns with more distinct values than this are not indexed (i.e. Invoice ID)
+
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)  # number of set bits in each byte
+
+
+def categorize(df, max_values=MAX_INDEX_VALUES):
+    ''' Converts the text columns of df with at most max_values distinct values to categoricals, returns df
+    '''
+
+    for column in df.columns:
+        if (pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column])) \
+                and not isinstance(df[column].dtype, pd.CategoricalDtype) \
+                and df[column].nunique() <= max_values:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def append_categorized(df, new_rows):
+    ''' Returns df with new_rows added to the end, keeping the categorical columns of df categorical
+    values in new_rows that are not yet categories of df are added as new categories
+    '''
+
+    new_rows = new_rows.copy()
+    df = df.copy(deep=False)  # the columns are replaced, not changed, so df itself is left as it was
+
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and column in new_rows.columns:
+            new_values = pd.Index(new_rows[column].dropna().unique()).difference(df[column].cat.categories)
+            if len(new_values):
+                df[column] = df[column].cat.add_categories(new_values)  # added at the end, so the codes stay the same
+            new_rows[column] = pd.Categorical(new_rows[column], categories=df[column].cat.categories)
+
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def extend_packed(packed, rows, bits):
+    ''' Returns the packed bitmap of rows bits followed by the boolean array bits
+    only the last (partly filled) byte of packed is unpacked again
+    '''
+
+    used = rows % 8
+    if used == 0:
+        return np.concatenate([packed, np.packbits(bits)])
+
+    last_bits = np.unpackbits(packed[-1:])[:used].astype(bool)
+    return np.concatenate([packed[:-1], np.packbits(np.concatenate([last_bits, bits]))])
+
+
+class BitmapIndex:
+    ''' Packed boolean bitmaps per value of every categorical column of a dataframe
+    build once with BitmapIndex(df), then use mask(selections) to get the rows of a filter selection
+    '''
+
+    def __init__(self, df):
+        self.rows = len(df)
+        self.bitmaps = {}  # {column: {value: packed bitmap}}
+
+        for column in df.columns:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                continue
+
+            codes = df[column].cat.codes.to_numpy()
+            self.bitmaps[column] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(df[column].cat.categories)
+                }
+
+    def extended(self, df):
+        ''' Returns the index of df, the rows of this index followed by new rows, with the bitmaps only extended
+        by the new rows (the rows of this index are not read again), this index is left as it was
+        the categories of df must be those of the indexed rows with any new ones at the end (see append_categorized)
+        '''
+
+        columns = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+        if columns != self.columns():  # the indexed columns changed, so index every row
+            return BitmapIndex(df)
+
+        index = copy.copy(self)
+        index.rows = len(df)
+        index.bitmaps = {}
+
+        empty = np.zeros(-(-self.rows // 8), dtype=np.uint8)  # the bitmap of a new value, none of the old rows have it
+        for column in columns:
+            codes = df[column].iloc[self.rows:].cat.codes.to_numpy()
+            index.bitmaps[column] = {
+                value: extend_packed(self.bitmaps[column].get(value, empty), self.rows, codes == code)
+                for code, value in enumerate(df[column].cat.categories)
+                }
+
+        return index
+
+    def columns(self):
+        ''' Returns the indexed column names
+        '''
+
+        return list(self.bitmaps)
+
+    def packed_mask(self, selections):
+        ''' Returns the packed bitmap of rows matching selections
+        selections is a dict of {column: list of selected values}, values not in the data match no rows
+        '''
+
+        packed = np.packbits(np.ones(self.rows, dtype=bool))  # start with every row selected (padding bits stay 0)
+
+        for column, values in selections.items():
+            bitmaps = self.bitmaps[column]  # KeyError if the column was not indexed
+
+            column_packed = np.zeros_like(packed)
+            for value in values:  # OR within a column
+                if value in bitmaps:
+                    column_packed |= bitmaps[value]
+
+            packed &= column_packed  # AND across columns
+
+        return packed
+
+    def mask(self, selections):
+        ''' Returns the boolean numpy mask of rows matching selections (see packed_mask)
+        '''
+
+        return np.unpackbits(self.packed_mask(selections), count=self.rows).astype(bool)
+
+    def count(self, selections):
+        ''' Returns the number of rows matching selections, without building the full mask
+        '''
+
+        return int(POPCOUNT[self.packed_mask(selections)].sum(dtype=np.int64))
@@ -0,0 +1,66 @@
+# Server-side pagination of the filtered data shown at the bottom of ExcelDashboard.py
+#
+# Passing the whole filtered dataframe to st.dataframe serializes every row and sends it to the browser on every rerun
+# Instead, we keep the filtered rows as an array of row positions (no copy of the data), sort those positions
+# on the server if asked, and only build the rows of the visible page with the chosen columns
+#
+# LIBRARIES: pandas, numpy
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    ''' Returns the number of pages needed for rows, always at least 1
+    '''
+
+    return max(1, -(-rows // page_size))  # ceiling division
+
+
+def sort_keys(values, ascending=True):
+    ''' Returns integer sort keys of the values (numpy array or pandas series), missing values sort last
+    '''
+
+    codes, uniques = pd.factorize(values, sort=True)  # codes are the rank of each value among the unique values
+    if not ascending:
+        codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+
+    return np.where(codes >= 0, codes, len(uniques))
+
+
+def ordered_positions(df, positions, sort_by=None, ascending=True, first_rows=None):
+    ''' Returns the positions (numpy int array of rows of df) ordered by the column sort_by
+    ties keep their original order, if sort_by is None the positions are returned as they are
+    if first_rows is given only that many leading positions are needed, so the rest are left unsorted (and dropped)
+    '''
+
+    if sort_by is None or len(positions) == 0:
+        return positions
+
+    # break ties by the original order, so every key is unique and the order is stable
+    keys = sort_keys(df[sort_by].to_numpy()[positions], ascending).astype(np.int64)
+    keys = keys * len(positions) + np.arange(len(positions))
+
+    if first_rows is not None and first_rows < len(positions):
+        # only the first rows need sorting, find them in linear time then sort just those
+        head = np.argpartition(keys, first_rows - 1)[:first_rows]
+        return positions[head[np.argsort(keys[head])]]
+
+    return positions[np.argsort(keys)]
+
+
+def get_page(df, positions, page, page_size=PAGE_SIZE, columns=None, sort_by=None, ascending=True):
+    ''' Returns the dataframe of rows on page (starting at 1) of the rows of df at positions
+    columns selects which columns are built (all if None)
+    '''
+
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(positions))
+
+    page_positions = ordered_positions(df, positions, sort_by, ascending, first_rows=end)[start:end]
+    if columns is None:
+        return df.iloc[page_positions]
+
+    return df.iloc[page_positions, [df.columns.get_loc(column) for column in columns]]
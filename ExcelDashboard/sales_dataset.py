@@ -0,0 +1,184 @@
+# The sales data shared by every session of ExcelDashboard.py, kept up to date as the workbooks grow
+#
+# Holds the dataframe, sorted by date and time, together with everything built from it
+# (the cube, the filter index, the time index, and a version used as a cache key)
+# A background thread watches the workbooks, and when rows were appended (or a workbook was added) only the new rows are read (see data_loader.py)
+# and added to the cube, so refreshing takes time in proportion to the new rows rather than all rows
+# Sessions take a consistent snapshot at the start of each rerun, and can wait for the next version to refresh themselves
+#
+# LIBRARIES: pandas, numpy
+
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from aggregates import build_sales_cube, merge_cubes
+from data_loader import concat_sales_frames, list_sources, update_sales_sources
+from filter_index import BitmapIndex, append_categorized, categorize
+from time_index import TimeIndex, sort_by_datetime
+
+POLL_SECONDS = 5.0  # how often the watcher checks the workbook for changes
+
+logger = logging.getLogger(__name__)
+
+
+def cube_version(cube):
+    ''' Returns a version string of the data, a hash of its cube (which is small)
+    '''
+
+    return str(pd.util.hash_pandas_object(cube, index=False).sum())
+
+
+def stat_keys(sources):
+    ''' Returns {(path, sheet name): (size, modification time)} of the workbooks of sources
+    workbooks that do not exist (anymore) are left out
+    '''
+
+    keys = {}
+    for path, sheet_name in sources:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:  # i.e. the configured workbook was renamed, or removed since it was listed
+            continue
+        keys[(path, sheet_name)] = (stat.st_size, stat.st_mtime_ns)
+
+    return keys
+
+
+class SalesDataset:
+    ''' The sales dataframe of the workbooks of source, its cube and filter index, refreshed when the workbooks change
+    source and sheet_names are as for data_loader.list_sources (a workbook, folder or glob pattern, and the sheets to read)
+    '''
+
+    def __init__(self, source, sheet_names=('Sales',), max_workers=None):
+        self.source = source
+        self.sheet_names = sheet_names
+        self.max_workers = max_workers
+        self.changed = threading.Condition()  # also the lock guarding the attributes below
+        self.watcher = None
+        self.missing = False  # True while none of the workbooks exist
+
+        self.load()
+
+    def load(self):
+        ''' (Re)loads the data of every sheet of every workbook
+        '''
+
+        keys = stat_keys(list_sources(self.source, self.sheet_names))
+        sources = list(keys)
+        if not sources:
+            raise FileNotFoundError(f'No sales workbooks found at {self.source}')
+
+        results = update_sales_sources(sources, self.max_workers)
+        df = sort_by_datetime(categorize(concat_sales_frames([frame for frame, _, _ in results])))
+
+        self.set_data(df, build_sales_cube(df), keys)
+        logger.info('Loaded %d rows from %d sheets of %s', len(df), len(sources), self.source)
+
+    def set_data(self, df, cube, keys, index=None, time_index=None):
+        ''' Replaces the data with df and its cube, read from the workbooks when they had keys (see stat_keys)
+        and wakes up anyone waiting for a change, the indexes are built from df unless they are given
+        '''
+
+        index = index if index is not None else BitmapIndex(df)
+        time_index = time_index if time_index is not None else TimeIndex(df)
+        version = cube_version(cube)
+
+        with self.changed:
+            self.df, self.cube, self.index, self.time_index, self.version = df, cube, index, time_index, version
+            self.stat_keys = keys
+            self.changed.notify_all()
+
+    def snapshot(self):
+        ''' Returns (df, cube, index, time_index, version), all of the same version of the data
+        '''
+
+        with self.changed:
+            return self.df, self.cube, self.index, self.time_index, self.version
+
+    def refresh(self):
+        ''' Updates the data if any workbook changed, returns True if the data did
+        rows appended to a workbook and new workbooks are added to the data and the cube,
+        anything else (a removed workbook, or rows changed in place) reloads everything
+        '''
+
+        keys = stat_keys(list_sources(self.source, self.sheet_names))
+        if not keys:  # every workbook is gone (i.e. renamed), the data is kept until they are back
+            if not self.missing:  # logged once, not on every poll
+                logger.warning('No sales workbooks found at %s, keeping the data loaded before', self.source)
+            self.missing = True
+            return False
+        self.missing = False
+
+        with self.changed:
+            if keys == self.stat_keys:
+                return False
+            df, cube, index, time_index, known = self.df, self.cube, self.index, self.time_index, self.stat_keys
+
+        if set(known) - set(keys):  # a workbook (or sheet) is gone
+            self.load()
+            return True
+
+        changed = [source for source in keys if known.get(source) != keys[source]]
+        new_frames = []
+        # only the new rows are read, the older rows of the changed sheets are already in df
+        results = update_sales_sources(changed, self.max_workers, with_frames=False)
+        for source, (frame, new_rows, status) in zip(changed, results):
+            if status == 'appended':
+                new_frames.append(new_rows)
+            elif status == 'parsed' and source not in known:
+                new_frames.append(frame)
+            elif status == 'parsed':  # rows changed in place, the cube can not be updated
+                self.load()
+                return True
+
+        new_frames = [frame for frame in new_frames if len(frame)]
+        if not new_frames:  # the files were touched but their content is the same
+            with self.changed:
+                self.stat_keys = keys
+            return False
+
+        new_rows = sort_by_datetime(categorize(concat_sales_frames(new_frames)))
+        cube = merge_cubes(cube, build_sales_cube(new_rows))
+        latest = len(df) == 0 or new_rows['Datetime'].iloc[0] >= df['Datetime'].iloc[-1]
+        df = append_categorized(df, new_rows)
+
+        if latest:  # appended rows are usually the latest, then df stays sorted and the indexes only add the new rows
+            self.set_data(df, cube, keys, index.extended(df), time_index.extended(df))
+        else:
+            self.set_data(sort_by_datetime(df), cube, keys)
+        logger.info('Added %d rows from %d changed sheets of %s', len(new_rows), len(changed), self.source)
+
+        return True
+
+    def wait_for_change(self, version, timeout):
+        ''' Waits until the data is no longer at version, returns True if it changed within timeout seconds
+        '''
+
+        with self.changed:
+            return self.changed.wait_for(lambda: self.version != version, timeout)
+
+    def start_watching(self, poll_seconds=POLL_SECONDS):
+        ''' Starts a background thread refreshing the data every poll_seconds (only once per dataset)
+        '''
+
+        with self.changed:
+            if self.watcher is not None:
+                return
+
+            self.watcher = threading.Thread(target=self.watch, args=(poll_seconds,), daemon=True)
+            self.watcher.start()
+
+    def watch(self, poll_seconds):
+        ''' The loop of the watcher thread, errors are logged so a bad save of the workbook does not stop it
+        '''
+
+        while True:
+            time.sleep(poll_seconds)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Refreshing %s failed', self.source)
@@ -0,0 +1,143 @@
+# Date-range filtering for ExcelDashboard.py
+#
+# The data is kept sorted by its 'Datetime' column, so the rows of a date range are one contiguous slice,
+# found by binary search (np.searchsorted) rather than comparing every row's date
+#
+# For the KPI's and charts, the cube (see aggregates.py) is also built per day, and summed cumulatively over the days
+# The cube of any date range is then the difference of two of these cumulative sums (one for each end of the range)
+# which takes the same time however many rows or days the range covers
+# Rows appended after the latest ones only add their own sums (see TimeIndex.extended)
+#
+# LIBRARIES: pandas, numpy
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from aggregates import cube_cells, measure_arrays
+
+MEASURES = ['total', 'count', 'rating_sum', 'rating_count']
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def sort_by_datetime(df):
+    ''' Returns df sorted by its 'Datetime' column (stable, so rows at the same time keep their order)
+    '''
+
+    if df['Datetime'].is_monotonic_increasing:
+        return df
+
+    return df.sort_values(by='Datetime', kind='stable', ignore_index=True)
+
+
+class TimeIndex:
+    ''' Sorted datetimes and daily cumulative cubes of a dataframe sorted by 'Datetime' (see sort_by_datetime)
+    '''
+
+    def __init__(self, df):
+        self.datetimes = df['Datetime'].to_numpy(dtype='datetime64[ns]')
+
+        # the day of each row, and the (sorted) list of days that have rows
+        row_days = self.datetimes.astype('datetime64[D]')
+        self.days, day_of_row = np.unique(row_days, return_inverse=True)
+
+        # sum every measure per (day, cell), then cumulatively over the days
+        # row i of the cumulative arrays is the sum over all days before days[i], so row 0 is all zeros
+        self.cells, cell_of_row, valid = cube_cells(df)
+        cells = len(self.cells)
+        key = day_of_row[valid] * cells + cell_of_row
+
+        self.cumulative = {}
+        for name, measure in zip(MEASURES, measure_arrays(df)):
+            sums = np.bincount(key, weights=measure[valid], minlength=len(self.days) * cells)
+            cumulative = np.zeros((len(self.days) + 1, cells))
+            np.cumsum(sums.reshape(len(self.days), cells), axis=0, out=cumulative[1:])
+            self.cumulative[name] = cumulative
+
+    def extended(self, df):
+        ''' Returns the time index of df, the rows of this index followed by new rows that are not earlier than them
+        only the new rows are read: their days and cells are added, and their sums added to the cumulative arrays
+        this index is left as it was
+        '''
+
+        rows = len(self.datetimes)
+        new_rows = df.iloc[rows:]
+
+        index = copy.copy(self)
+        index.datetimes = df['Datetime'].to_numpy(dtype='datetime64[ns]')
+
+        # the days of the new rows, the first may be the last day of this index
+        row_days = index.datetimes[rows:].astype('datetime64[D]')
+        new_days = np.unique(row_days)
+        index.days = np.union1d(self.days, new_days)
+        day_of_row = np.searchsorted(index.days, row_days)
+        first_day = np.searchsorted(index.days, new_days[0]) if len(new_days) else len(index.days)
+
+        # the cells of the new rows, numbered after the cells of this index if they are new
+        cells, new_cell_of_row, valid = cube_cells(new_rows)
+        cell_ids = {cell: i for i, cell in enumerate(self.cells.itertuples(index=False, name=None))}
+        added = [cell for cell in cells.itertuples(index=False, name=None) if cell not in cell_ids]
+        cell_ids.update({cell: len(self.cells) + i for i, cell in enumerate(added)})
+        cell_of_new = np.array([cell_ids[cell] for cell in cells.itertuples(index=False, name=None)], dtype=np.int64)
+        if added:
+            index.cells = pd.concat([self.cells, pd.DataFrame(added, columns=self.cells.columns)], ignore_index=True)
+        cell_count = len(index.cells)
+
+        days = len(index.days) - first_day
+        key = (day_of_row[valid] - first_day) * cell_count + cell_of_new[new_cell_of_row]
+
+        # the cumulative sums of this index, carried on to the new days, plus the cumulative sums of the new rows
+        index.cumulative = {}
+        for name, measure in zip(MEASURES, measure_arrays(new_rows)):
+            old = self.cumulative[name]
+            cumulative = np.zeros((len(index.days) + 1, cell_count))
+            cumulative[:len(old), :old.shape[1]] = old
+            cumulative[len(old):, :old.shape[1]] = old[-1]
+
+            sums = np.bincount(key, weights=measure[valid], minlength=days * cell_count)
+            cumulative[first_day + 1:] += np.cumsum(sums.reshape(days, cell_count), axis=0)
+            index.cumulative[name] = cumulative
+
+        return index
+
+    def date_bounds(self):
+        ''' Returns the (first, last) dates of the data as datetime.date, or None if there is no data
+        '''
+
+        if len(self.days) == 0:
+            return None
+
+        return pd.Timestamp(self.days[0]).date(), pd.Timestamp(self.days[-1]).date()
+
+    def day_range(self, start, end):
+        ''' Returns the (lo, hi) slice of days from date start to date end (both included)
+        '''
+
+        lo = np.searchsorted(self.days, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.days, np.datetime64(end, 'D'), side='right')
+
+        return lo, max(lo, hi)
+
+    def row_range(self, start, end):
+        ''' Returns the (lo, hi) slice of rows from date start to date end (both included)
+        '''
+
+        lo = np.searchsorted(self.datetimes, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.datetimes, np.datetime64(end, 'D') + ONE_DAY, side='left')
+
+        return lo, max(lo, hi)
+
+    def range_cube(self, start, end):
+        ''' Returns the cube (see aggregates.build_sales_cube) of the rows from date start to date end (both included)
+        '''
+
+        lo, hi = self.day_range(start, end)
+
+        cube = self.cells.copy()
+        for name in MEASURES:
+            cube[name] = self.cumulative[name][hi] - self.cumulative[name][lo]
+        cube['count'] = cube['count'].round().astype(np.int64)
+        cube['rating_count'] = cube['rating_count'].round().astype(np.int64)
+
+        return cube[(cube['count'] > 0) | (cube['rating_count'] > 0)].reset_index(drop=True)  # only cells with rows in the range
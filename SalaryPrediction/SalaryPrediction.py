@@ -13,8 +13,8 @@
 # This scripts purpose is to create the dataframe used, perform some pre-processing, create and save the model
 # there are some visuals using streamlit
 # run in the usual streamlit fashion
+# to retrain the model without streamlit (with a test set, and a parallel search over more parameters) see train.py
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 from sklearn.preprocessing import LabelEncoder
@@ -25,72 +25,20 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error
 import numpy as np
 import pickle
 
+from prediction_table import export_table
+from tree_model import export_model
+from survey_data import clean_survey, read_survey
+
 def main():
     # --- Dataframe and pre-processing
-    df = pd.read_csv('survey_results_public.csv')
+    df = read_survey('survey_results_public.csv')  # only the columns we want, of the rows with a full-time job
     st.dataframe(df)  # initial dataframe
 
-    df = df[['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']]  # get only the columns we want
-    df = df.rename({'ConvertedCompYearly': 'Salary'}, axis=1)  # renames column to Salary
-    df = df[df['Salary'].notnull()]  # only keep rows where a Salary is given
-    df = df.dropna()  # gets rid of all rows with N/A listed
-    df = df[df['Employment'] == 'Employed, full-time']  # only want rows where they were employed full time
-    df = df.drop('Employment', axis=1)  # we can remove this column since they should all now be the same
-
-    # Helper function to help move the rows where few people answered from that country to 'Other' (move countries with low-data)
-    def shorten_categories(categories, cutoff):
-        ''' Passes through categories and changes indices with value below cutoff to 'Other'
-        categories must be a pandas dataframe of 2 columns, cutoff must be an integer
-        '''
-
-        # a dict that will contain all the countries we passed as key
-        # if the value of that key (for this dict) is the country itself, nothing changes
-        # if it is other, the map will make the dataframe change the index (when we map it afterwards)
-        # dict will look like {'USA': 'USA', 'UK': 'UK', 'Namibia': 'Other', etc.}
-        categorical_map = {}
-
-        for i in range(len(categories)):  # pass through all rows
-            if categories.values[i] >= cutoff:  # if the value for that index is greater than cutoff
-                categorical_map[categories.index[i]] = categories.index[i]  # listed index should be passed in
-            else:
-                categorical_map[categories.index[i]] = 'Other'  # otherwise list as other
-
-        return categorical_map
-
-    country_map = shorten_categories(df.Country.value_counts(), 400)  # atleast 400 people must have answered or else that country is moved to other
-    df['Country'] = df['Country'].map(country_map)  # now only countries past cutoff are the same, below and they are concatenated to Other
-    df = df[df['Country'] != 'Other']  # drop the Other category
-
-    df = df[df['Salary'] <= 250000]
-    df = df[df['Salary'] >= 10000]  # salary must be less than 250k and more than 10k, removing outliers
-
-    # Helper function to change 'Less than 1 year' to 0.5, and 'More than 50 years' to 50
-    def clean_experience(x):
-        ''' Returns a float value depending on string input
-        x must be a string
-        '''
-
-        if x == 'More than 50 years':
-            return 50
-        elif x == 'Less than 1 year':
-            return 0.5
-        else:  # if it is a number, cast it to float
-            return float(x)
-
-    df['YearsCodePro'] = df['YearsCodePro'].apply(clean_experience)  # applies function to each value
-
-    # Helper function to format the educations listed
-    def clean_education(x):
-        if 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)' in x:
-            return 'Bachelors'
-        elif 'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)' in x:
-            return 'Masters'
-        elif 'Other doctoral degree (Ph.D., Ed.D., etc.)' in x:
-            return 'Post Grad'
-        else:
-            return 'Less than a Bachelors'
-
-    df['EdLevel'] = df['EdLevel'].apply(clean_education)
+    # the cleaning is shared with the app (see survey_data.py):
+    # only full-time employees who gave a salary between 10k and 250k (outliers removed)
+    # countries with less than 400 answers are dropped, 'Less than 1 year' of experience is 0.5 and 'More than 50 years' is 50
+    # and the education is one of 'Less than a Bachelors', 'Bachelors', 'Masters', 'Post Grad'
+    df = clean_survey(df)
 
     st.dataframe(df)
     st.write(df.Country.value_counts())  # each country listed
@@ -143,11 +91,9 @@ def main():
     parameters = {'max_depth': max_depth}
 
     regressor = DecisionTreeRegressor(random_state=0)
-    gs = GridSearchCV(regressor, parameters, scoring='neg_mean_squared_error')  # scoring is how we determine how good it is, based off of negated mean squared error
+    gs = GridSearchCV(regressor, parameters, scoring='neg_mean_squared_error', n_jobs=-1)  # scoring is how we determine how good it is, based off of negated mean squared error, n_jobs=-1 runs the folds on every core
     gs.fit(X, y.values)
-    regressor = gs.best_estimator_  # now regressor has best parameters from our list
-
-    regressor.fit(X, y.values)
+    regressor = gs.best_estimator_  # now regressor has best parameters from our list, already fit on all data by GridSearchCV (refit=True)
 
     # prediction and error
     y_pred = regressor.predict(X)
@@ -191,5 +137,19 @@ def main():
     new_y_pred = regressor_loaded.predict(new_x)
     st.write(f'Prediction for passed in (loaded): ${float(new_y_pred):,.02f}')
 
+    # --- Save model as numpy arrays
+    # the app loads this instead of the pickle: it needs no scikit-learn, can not run code, and is memory-mapped
+    # export_model checks the saved model predicts the same salaries as the trained one (raises ValueError otherwise)
+    export_model(data, X.values)
+    st.write('Saved salary_model.npz')
+
+    # --- Save table of predictions
+    # the prediction page only has 15 countries x 4 educations x 51 years of experience as inputs
+    # so all their predictions are saved in a table, the page looks them up instead of running the model
+    # export_table checks the saved table gives the same salaries as the model (raises ValueError otherwise)
+    table = export_table(data)
+    st.write(f'Prediction for passed in (table): ${table.lookup("United States of America", "Masters", 15):,.02f}')
+
+
 if __name__ == '__main__':
-    main()
+    main()
\ No newline at end of file
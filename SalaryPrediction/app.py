@@ -1,14 +1,42 @@
+import importlib
+import os
+import threading
+
 import streamlit as st
-import pickle
-import numpy as np
 
-from predict_page import show_predict_page
-from explore_page import show_explore_page
+# the pages, {name: (module, function showing the page, function loading its data or model)}
+# a page's module (and its data or model) is only imported when the page is first selected
+PAGES = {
+    'Predict': ('predict_page', 'show_predict_page', 'load_registry'),
+    'Explore': ('explore_page', 'show_explore_page', 'load_aggregates')
+    }
+
+# after the first page is shown, load the other pages in the background so switching to them is quick
+# set the SALARY_WARM_PAGES environment variable to 0 to only load pages when they are selected
+WARM_PAGES = os.environ.get('SALARY_WARM_PAGES', '1') != '0'
+
+
+def warm_pages():
+    for module_name, _, load_name in PAGES.values():
+        try:
+            getattr(importlib.import_module(module_name), load_name)()
+        except Exception:  # i.e. the survey file is missing, the page shows the error when it is selected
+            pass
+
+
+# once for the whole server, not once per session or rerun
+@st.experimental_singleton
+def start_warming():
+    thread = threading.Thread(target=warm_pages, name='warm-pages', daemon=True)
+    thread.start()
+    return thread
+
 
 # use sidebar to choose which sites to use
-page = st.sidebar.selectbox('Explore or Predict', ('Predict', 'Explore'))  # a selectbox to select Predict or Explore on the sidebar
+page = st.sidebar.selectbox('Explore or Predict', tuple(PAGES))  # a selectbox to select Predict or Explore on the sidebar
+
+module_name, show_name, _ = PAGES[page]
+getattr(importlib.import_module(module_name), show_name)()
 
-if page == 'Predict':
-    show_predict_page()
-elif page == 'Explore':
-    show_explore_page()
+if WARM_PAGES:
+    start_warming()
@@ -0,0 +1,114 @@
+# Salary predictions for a whole file of candidates (csv or parquet), used by the prediction page
+#
+# The file needs a Country, an Education and an Experience column (or the survey's names: EdLevel and YearsCodePro)
+# with the same values as the prediction page, i.e. 'Germany', 'Masters', 10
+# The categories are encoded by one categorical lookup per column, and the rows are predicted in chunks
+# Rows that can not be predicted (an unknown country, no experience, ...) get no salary and the reason in 'Error',
+# the rest of the file is still predicted
+#
+# LIBRARIES: pandas, numpy, pyarrow (for parquet files)
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from survey_data import EXPERIENCE_SENTINELS, by_value
+
+CHUNK_ROWS = 10000  # rows predicted at a time
+
+# {column: other names it may have in the file}
+INPUT_COLUMNS = {
+    'Country': ['Country'],
+    'Education': ['Education', 'EdLevel'],
+    'Experience': ['Experience', 'YearsCodePro']
+    }
+
+
+def read_candidates(file, name):
+    ''' Returns the dataframe of the csv or parquet file (a path or file-like object), name tells which one it is
+    '''
+
+    if name.lower().endswith('.parquet'):
+        return pd.read_parquet(file)
+
+    return pd.read_csv(file)
+
+
+def input_columns(df):
+    ''' Returns {input: column of df} for the inputs of INPUT_COLUMNS
+    raises ValueError if df has no column for one of them
+    '''
+
+    columns = {}
+    for column, names in INPUT_COLUMNS.items():
+        found = [name for name in names if name in df.columns]
+        if not found:
+            raise ValueError(f'The file needs a {" or ".join(names)} column')
+        columns[column] = found[0]
+
+    return columns
+
+
+def encode(values, classes):
+    ''' Returns the int array of the index of each value in classes (the sorted categories of a TreeModel), -1 if unknown
+    '''
+
+    return pd.Categorical(values.astype(object), categories=classes).codes.astype(np.int64)
+
+
+def score_chunk(chunk, model, columns):
+    ''' Returns chunk with the predicted salaries in 'Salary' and the reason a row was not predicted in 'Error'
+    model is the TreeModel (see tree_model.py), columns is input_columns()
+    '''
+
+    countries = encode(chunk[columns['Country']], model.countries)
+    educations = encode(chunk[columns['Education']], model.educations)
+    experiences = by_value(chunk[columns['Experience']], lambda values: pd.to_numeric(
+        values.replace(EXPERIENCE_SENTINELS), errors='coerce'
+        ).astype(float).values).values.astype(float)
+
+    # (rows with the problem, message), the message is followed by the value of the row
+    problems = [
+        (countries < 0, 'unknown Country '),
+        (educations < 0, 'unknown Education '),
+        (np.isnan(experiences), 'invalid Experience ')
+        ]
+    valid = ~np.logical_or.reduce([problem for problem, _ in problems])
+
+    salaries = np.full(len(chunk), np.nan)
+    if valid.any():
+        x = np.column_stack([countries[valid], educations[valid], experiences[valid]]).astype(float)
+        salaries[valid] = model.predict(x)
+
+    errors = np.full(len(chunk), '', dtype=object)
+    for (problem, message), column in zip(problems, ['Country', 'Education', 'Experience']):
+        described = message + np.asarray(chunk[columns[column]].values[problem], dtype=str).astype(object)
+        errors[problem] = np.where(errors[problem] == '', described, errors[problem] + '; ' + described)
+
+    return chunk.assign(Salary=salaries, Error=errors)
+
+
+def score_candidates(df, model, chunk_rows=CHUNK_ROWS):
+    ''' Yields the scored chunks (see score_chunk) of the dataframe df, of chunk_rows rows each
+    raises ValueError if df does not have the columns needed
+    '''
+
+    columns = input_columns(df)
+    for start in range(0, len(df), chunk_rows):
+        yield score_chunk(df.iloc[start:start + chunk_rows], model, columns)
+
+
+def write_csv(chunks, file):
+    ''' Writes the scored chunks as one csv to file (a file-like object, bytes), returns (rows, rows not predicted)
+    '''
+
+    rows = failed = 0
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+    for chunk in chunks:
+        chunk.to_csv(text, header=rows == 0, index=False)
+        rows += len(chunk)
+        failed += int((chunk['Error'] != '').sum())
+    text.detach()  # leaves file open for the caller
+
+    return rows, failed
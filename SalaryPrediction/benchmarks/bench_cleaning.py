@@ -0,0 +1,105 @@
+# Benchmark of the survey cleaning
+#
+# Compares the original row-wise cleaning (Series.apply of clean_experience and clean_education, and a python loop
+# over value_counts() for the countries) against the vectorized clean_survey of survey_data.py, and checks both agree
+# Uses survey_results_public.csv if it is in the SalaryPrediction folder, or else a synthetic survey of the same size
+#
+# run from the SalaryPrediction folder: 'python benchmarks/bench_cleaning.py'
+
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so the app modules can be imported
+
+from survey_data import clean_survey
+from synthetic_survey import SURVEY_ROWS, survey
+
+SURVEY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'survey_results_public.csv')
+REPEATS = 5
+
+
+def original_cleaning(df):
+    ''' The cleaning as explore_page.load_data() and SalaryPrediction.main() used to do it
+    '''
+
+    def shorten_categories(categories, cutoff):
+        categorical_map = {}
+        for i in range(len(categories)):
+            if categories.values[i] >= cutoff:
+                categorical_map[categories.index[i]] = categories.index[i]
+            else:
+                categorical_map[categories.index[i]] = 'Other'
+        return categorical_map
+
+    def clean_experience(x):
+        if x == 'More than 50 years':
+            return 50
+        elif x == 'Less than 1 year':
+            return 0.5
+        else:
+            return float(x)
+
+    def clean_education(x):
+        if 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)' in x:
+            return 'Bachelors'
+        elif 'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)' in x:
+            return 'Masters'
+        elif 'Other doctoral degree (Ph.D., Ed.D., etc.)' in x:
+            return 'Post Grad'
+        else:
+            return 'Less than a Bachelors'
+
+    df = df[['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']]
+    df = df.rename({'ConvertedCompYearly': 'Salary'}, axis=1)
+    df = df[df['Salary'].notnull()]
+    df = df.dropna()
+    df = df[df['Employment'] == 'Employed, full-time']
+    df = df.drop('Employment', axis=1)
+
+    country_map = shorten_categories(df.Country.value_counts(), 400)
+    df['Country'] = df['Country'].map(country_map)
+    df = df[df['Country'] != 'Other']
+
+    df = df[df['Salary'] <= 250000]
+    df = df[df['Salary'] >= 10000]
+
+    df['YearsCodePro'] = df['YearsCodePro'].apply(clean_experience)
+    df['EdLevel'] = df['EdLevel'].apply(clean_education)
+
+    return df
+
+
+def best_time(function):
+    ''' Returns the best time in seconds of REPEATS calls of function
+    '''
+
+    return min(timeit.repeat(function, number=1, repeat=REPEATS))
+
+
+def main():
+    pd.options.mode.chained_assignment = None  # the original cleaning assigns to slices
+
+    if os.path.exists(SURVEY_FILE):
+        print(f'survey: {SURVEY_FILE}')
+        raw = pd.read_csv(SURVEY_FILE)
+    else:
+        print(f'survey: synthetic, {SURVEY_ROWS:,} rows (survey_results_public.csv not found)')
+        raw = survey(SURVEY_ROWS)
+
+    original = original_cleaning(raw)
+    vectorized = clean_survey(raw)
+    pd.testing.assert_frame_equal(original, vectorized[original.columns], check_dtype=False)
+
+    original_time = best_time(lambda: original_cleaning(raw))
+    vectorized_time = best_time(lambda: clean_survey(raw))
+
+    print(f'{len(raw):,} answers, {len(vectorized):,} kept')
+    print(f'{"original":>12} {"vectorized":>12} {"speedup":>10}')
+    print(f'{original_time * 1000:>10.2f}ms {vectorized_time * 1000:>10.2f}ms {original_time / vectorized_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Benchmark of reading the survey csv
+#
+# Compares the original full read (pd.read_csv of all the columns, then clean_survey) against read_survey of
+# survey_data.py (only the used columns, categoricals, filtered while reading), with and without pyarrow
+# each is run in its own process, so the peak memory of each can be measured
+# Uses survey_results_public.csv if it is in the SalaryPrediction folder, or else a synthetic survey of the same size
+#
+# run from the SalaryPrediction folder: 'python benchmarks/bench_reading.py'
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so the app modules can be imported
+
+import survey_data
+from synthetic_survey import SURVEY_ROWS, survey
+
+SURVEY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'survey_results_public.csv')
+
+
+def peak_memory():
+    ''' Returns the peak memory (resident set size) of this process in MB, or None if it can not be measured here
+    '''
+
+    try:
+        with open('/proc/self/status') as file:  # linux, VmHWM is only of this process (max RSS includes its parent's)
+            return next(int(line.split()[1]) for line in file if line.startswith('VmHWM')) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource  # unix only
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil  # windows, the peak working set of this process
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+def read(method, path, results):
+    ''' Reads and cleans the survey at path with method ('full', 'pyarrow' or 'chunked'), puts (seconds, peak memory in MB)
+    the peak memory is None where it can not be measured (see peak_memory)
+    '''
+
+    start = time.perf_counter()
+    if method == 'full':
+        survey_data.clean_survey(pd.read_csv(path))
+    else:
+        if method == 'chunked':
+            survey_data.pa = None  # as if pyarrow was not installed
+        survey_data.clean_survey(survey_data.read_survey(path))
+    seconds = time.perf_counter() - start
+
+    results.put((seconds, peak_memory()))
+
+
+def measure(method, path):
+    ''' Returns (seconds, peak memory in MB) of method, in a new process
+    '''
+
+    context = multiprocessing.get_context('spawn')  # a fresh process, not a copy of this one's memory
+    results = context.Queue()
+    process = context.Process(target=read, args=(method, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        path = SURVEY_FILE
+        if not os.path.exists(path):
+            print(f'survey: synthetic, {SURVEY_ROWS:,} rows (survey_results_public.csv not found)')
+            path = os.path.join(folder, 'survey.csv')
+            survey(SURVEY_ROWS).to_csv(path, index=False)
+
+        methods = ['full', 'chunked'] + (['pyarrow'] if survey_data.pa is not None else [])
+        print(f'{"method":>10} {"time":>10} {"peak":>10}')
+        for method in methods:
+            seconds, max_rss = measure(method, path)
+            peak = f'{max_rss:>8.0f}MB' if max_rss is not None else f'{"n/a":>10}'
+            print(f'{method:>10} {seconds * 1000:>8.0f}ms {peak}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Benchmark of predicting salaries for many users at once
+#
+# Many threads (the sessions of the app) each predict salaries one at a time, with:
+#   sklearn   the LabelEncoders and regressor.predict on a 1x3 array, as the prediction page used to
+#   tree      TreeModel.predict_salaries of one salary (see tree_model.py)
+#   service   PredictionService.predict, batching the requests of all the threads (see prediction_service.py)
+# and checks all three predict the same salaries
+# The model is a decision tree trained on a synthetic survey (see synthetic_survey.py)
+#
+# run from the SalaryPrediction folder: 'python benchmarks/bench_serving.py'
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # so the app modules can be imported
+
+from prediction_service import PredictionService
+from survey_data import clean_survey
+from synthetic_survey import survey
+from tree_model import TreeModel
+
+USERS = 256  # threads predicting at once
+REQUESTS = 50  # predictions of each thread
+
+
+def train_model():
+    ''' Returns the dict of the regressor and LabelEncoders (as saved by SalaryPrediction.py) of a synthetic survey
+    '''
+
+    df = clean_survey(survey(80000))
+    le_country = LabelEncoder().fit(df['Country'].astype(str))
+    le_education = LabelEncoder().fit(df['EdLevel'].astype(str))
+    x = np.column_stack([le_country.transform(df['Country'].astype(str)), le_education.transform(df['EdLevel'].astype(str)),
+                         df['YearsCodePro'].values]).astype(float)
+    regressor = DecisionTreeRegressor(max_depth=10, random_state=0).fit(x, df['Salary'].values)
+
+    return {'model': regressor, 'le_country': le_country, 'le_education': le_education}
+
+
+def run_users(predict, inputs):
+    ''' Returns (seconds, salaries) of USERS threads each predicting its REQUESTS inputs one at a time with predict
+    '''
+
+    salaries = np.zeros((USERS, REQUESTS))
+    barrier = threading.Barrier(USERS + 1)
+
+    def user(i):
+        barrier.wait()
+        for j, (country, education, experience) in enumerate(inputs[i]):
+            salaries[i, j] = predict(country, education, experience)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(USERS)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+
+    return time.perf_counter() - start, salaries
+
+
+def main():
+    data = train_model()
+    model = TreeModel.from_sklearn(data)
+
+    rng = np.random.default_rng(0)
+    inputs = [[(rng.choice(model.countries), rng.choice(model.educations), int(rng.integers(0, 51)))
+               for _ in range(REQUESTS)] for _ in range(USERS)]
+
+    def sklearn_predict(country, education, experience):
+        x = np.array([[data['le_country'].transform([country])[0], data['le_education'].transform([education])[0],
+                       experience]]).astype(float)
+        return float(data['model'].predict(x)[0])
+
+    def tree_predict(country, education, experience):
+        return float(model.predict_salaries([country], [education], [experience])[0])
+
+    service = PredictionService().start()
+
+    def service_predict(country, education, experience):
+        return service.predict(model, country, education, experience)
+
+    print(f'{USERS} users x {REQUESTS} predictions')
+    print(f'{"method":>10} {"time":>10} {"per second":>12}')
+    results = {}
+    for name, predict in [('sklearn', sklearn_predict), ('tree', tree_predict), ('service', service_predict)]:
+        seconds, results[name] = run_users(predict, inputs)
+        print(f'{name:>10} {seconds * 1000:>8.0f}ms {USERS * REQUESTS / seconds:>12,.0f}')
+
+    stats = service.stats()
+    print(f'service: {stats["batches"]:,} batches, mean size {stats["mean_batch_size"]:.1f}, '
+          f'max queue depth {stats["max_queue_depth"]}')
+    print('same salaries: ' + str(all(np.array_equal(results['sklearn'], results[name]) for name in ['tree', 'service'])))
+
+
+if __name__ == '__main__':
+    main()
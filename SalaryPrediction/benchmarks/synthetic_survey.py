@@ -0,0 +1,72 @@
+# Generator of a synthetic Stack Overflow survey, with the columns and answers of survey_results_public.csv
+#
+# The survey itself has to be downloaded (see the README), so the benchmarks fall back on this one when it is missing
+# The columns used by the app have answers drawn from the same categories as the real survey, the other columns are
+# filler text, so the file has about the same width (79 columns) and size as the real one
+#
+# run from the SalaryPrediction folder: 'python benchmarks/synthetic_survey.py 73268 synthetic_survey.csv'
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+SURVEY_ROWS = 73268  # the answers of the 2022 survey
+FILLER_COLUMNS = 74
+
+COUNTRIES = [
+    'United States of America', 'Germany', 'United Kingdom of Great Britain and Northern Ireland', 'India', 'Canada',
+    'France', 'Brazil', 'Spain', 'Netherlands', 'Australia', 'Italy', 'Poland', 'Sweden', 'Russian Federation',
+    'Switzerland', 'Austria', 'Israel', 'Norway', 'Nigeria', 'Japan', 'Mexico', 'Namibia', 'Iceland', 'Nepal'
+    ]
+COUNTRY_WEIGHTS = np.array([40, 12, 10, 9, 6, 5, 5, 4, 4, 4, 3, 3, 3, 3, 3, 2, 2, 1, 1, 1, 1, 0.3, 0.2, 0.2])
+ED_LEVELS = [
+    'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+    'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+    'Other doctoral degree (Ph.D., Ed.D., etc.)',
+    'Some college/university study without earning a degree',
+    'Secondary school (e.g. American high school, German Realschule or Gymnasium, etc.)',
+    'Associate degree (A.A., A.S., etc.)',
+    'Professional degree (JD, MD, etc.)',
+    'Primary/elementary school',
+    'Something else'
+    ]
+EMPLOYMENTS = [
+    'Employed, full-time', 'Employed, full-time;Independent contractor, freelancer, or self-employed',
+    'Independent contractor, freelancer, or self-employed', 'Employed, part-time', 'Student, full-time',
+    'Not employed, but looking for work'
+    ]
+EMPLOYMENT_WEIGHTS = np.array([60, 8, 8, 6, 12, 6])
+YEARS = ['Less than 1 year'] + [str(year) for year in range(1, 51)] + ['More than 50 years']
+
+
+def survey(rows, seed=0):
+    ''' Returns a dataframe of rows random survey answers
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    def answers(values, weights=None, missing=0.0):
+        p = None if weights is None else weights / weights.sum()
+        column = pd.Series(rng.choice(values, rows, p=p), dtype=object)
+        return column.mask(rng.random(rows) < missing)
+
+    df = pd.DataFrame({'ResponseId': np.arange(1, rows + 1)})
+    df['MainBranch'] = answers(['I am a developer by profession', 'I code primarily as a hobby'])
+    df['Employment'] = answers(EMPLOYMENTS, EMPLOYMENT_WEIGHTS, missing=0.02)
+    df['Country'] = answers(COUNTRIES, COUNTRY_WEIGHTS)
+    df['EdLevel'] = answers(ED_LEVELS, missing=0.02)
+    df['YearsCodePro'] = answers(YEARS[:40] + YEARS[-2:], missing=0.3)
+
+    salaries = np.exp(rng.normal(11, 0.9, rows)).round()
+    df['ConvertedCompYearly'] = pd.Series(salaries).mask(rng.random(rows) < 0.45)
+
+    for i in range(FILLER_COLUMNS):
+        df[f'Q{i}'] = answers([f'Answer {j} of question {i}' for j in range(8)], missing=0.1)
+
+    return df
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else SURVEY_ROWS
+    survey(rows).to_csv(sys.argv[2] if len(sys.argv) > 2 else 'synthetic_survey.csv', index=False)
@@ -0,0 +1,124 @@
+# A store of the datasets used by the SalaryPrediction app, shared by all sessions
+#
+# The legacy @st.cache hashes the returned dataframe on every call (to detect if it was changed), which takes time
+# in proportion to the size of the data on every rerun, and keeps as many copies as it likes
+# Instead, this store holds one read-only copy of each dataset for the whole process, within a memory budget:
+# datasets are stored with a version (i.e. the size and modification time of the source file), a different version
+# reloads the dataset, and the least recently used datasets are evicted when the budget is exceeded
+#
+# The datasets must not be changed by the callers, they are shared by every session
+#
+# LIBRARIES: pandas
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+BUDGET_BYTES = int(os.environ.get('DATASET_STORE_BUDGET_MB', '512')) * 1024 * 1024
+
+
+def file_version(path):
+    ''' Returns a version of the file at path, its (size, modification time), or None if it does not exist
+    '''
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def memory_size(value):
+    ''' Returns the approximate memory size of value in bytes (exact for pandas objects)
+    '''
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sum(memory_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(memory_size(item) for item in value)
+
+    return sys.getsizeof(value)
+
+
+class DatasetStore:
+    ''' Versioned datasets within a memory budget, evicting the least recently used ones
+    safe to use from the threads of different sessions
+    '''
+
+    def __init__(self, budget_bytes=BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # {name: (version, value, size)}, the most recently used is last
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        self.loading = {}  # {name: lock}, so a dataset is only loaded once when many sessions ask for it together
+
+    def get(self, name, version, loader):
+        ''' Returns the dataset name at version, calling loader() to load it if it is not stored (or at another version)
+        '''
+
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(name)
+                self.hits += 1
+                return entry[1]
+            name_lock = self.loading.setdefault(name, threading.Lock())
+
+        with name_lock:
+            with self.lock:  # another session may have loaded it while we waited
+                entry = self.entries.get(name)
+                if entry is not None and entry[0] == version:
+                    self.entries.move_to_end(name)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+            value = loader()
+            self.put(name, version, value)
+            return value
+
+    def put(self, name, version, value):
+        ''' Stores value as the dataset name at version, evicting the least recently used datasets to stay in the budget
+        the dataset itself is always stored, even if it is larger than the whole budget
+        '''
+
+        size = memory_size(value)
+
+        with self.lock:
+            if name in self.entries:
+                self.bytes -= self.entries.pop(name)[2]
+
+            self.entries[name] = (version, value, size)
+            self.bytes += size
+
+            while self.bytes > self.budget_bytes and len(self.entries) > 1:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        ''' Returns a dict of the datasets, bytes, hits, misses and evictions of the store
+        '''
+
+        with self.lock:
+            return {
+                'datasets': {name: entry[2] for name, entry in self.entries.items()},
+                'bytes': self.bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+                }
+
+
+# the store of the process, imported modules are shared by every session of a streamlit app
+STORE = DatasetStore()
@@ -1,116 +1,106 @@
+import io
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
+from dataset_store import STORE, file_version
+from survey_cache import load_cleaned
+from survey_years import dataset_version, dataset_years, read_years
 
-def shorten_categories(categories, cutoff):
-    ''' Passes through categories and changes indices with value below cutoff to 'Other'
-    categories must be a pandas dataframe of 2 columns, cutoff must be an integer
-    '''
+SURVEY_FILE = 'survey_results_public.csv'
 
-    categorical_map = {}
 
-    for i in range(len(categories)):
-        if categories.values[i] >= cutoff:
-            categorical_map[categories.index[i]] = categories.index[i]
-        else:
-            categorical_map[categories.index[i]] = 'Other'
+def read_data():
+    # read the used columns and preprocessing (see survey_data.py, the same cleaning as the training)
+    # from the cache shared with the training (see survey_cache.py), the csv is only read if it changed
+    df, _ = load_cleaned(SURVEY_FILE)
+    return df
 
-    return categorical_map
 
+def data_source(years=None):
+    # (name, version, loader) of the data in the store (see dataset_store.py), read again only if the survey file changes
+    # with years, the data of those years of the dataset of several surveys (see survey_years.py)
+    if years:
+        return f'survey-{"-".join(map(str, years))}', dataset_version(years), lambda: read_years(years)
 
-def clean_experience(x):
-    ''' Returns a float value depending on string input
-    x must be a string
-    '''
+    return 'survey', file_version(SURVEY_FILE), read_data
 
-    if x == 'More than 50 years':
-        return 50
-    elif x == 'Less than 1 year':
-        return 0.5
-    else:
-        return float(x)
 
+def load_data(years=None):
+    # one copy of the data for all sessions (see dataset_store.py)
+    name, version, loader = data_source(years)
+    return STORE.get(name, version, loader)
 
-def clean_education(x):
-    if 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)' in x:
-        return 'Bachelors'
-    elif 'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)' in x:
-        return 'Masters'
-    elif 'Other doctoral degree (Ph.D., Ed.D., etc.)' in x:
-        return 'Post Grad'
-    else:
-        return 'Less than a Bachelors'
 
-@st.cache
-def load_data():
-    # reload all data and preprocessing, cache the result
-    df = pd.read_csv('survey_results_public.csv')
+def render_pie(data):
+    # the pie-chart of the country counts as png bytes
+    # a Figure of its own (not pyplot's), so nothing is left open once the png is saved, and sessions can draw in parallel
+    fig = Figure()
+    ax = fig.subplots()
 
-    df = df[['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']]
-    df = df.rename({'ConvertedCompYearly': 'Salary'}, axis=1)
-    df = df[df['Salary'].notnull()]
-    df = df.dropna()
-    df = df[df['Employment'] == 'Employed, full-time']
-    df = df.drop('Employment', axis=1)
+    ax.pie(data, labels=data.index, autopct='%1.1f%%', shadow=True, startangle=90)  # nice looking arguments
+    ax.axis('equal')  # equal sized x and y
 
-    country_map = shorten_categories(df.Country.value_counts(), 400)
-    df['Country'] = df['Country'].map(country_map)
-    df = df[df['Country'] != 'Other']
+    png = io.BytesIO()
+    fig.savefig(png, format='png', bbox_inches='tight')
+    return png.getvalue()
 
-    df = df[df['Salary'] <= 250000]
-    df = df[df['Salary'] >= 10000]
 
-    df['YearsCodePro'] = df['YearsCodePro'].apply(clean_experience)
-    df['EdLevel'] = df['EdLevel'].apply(clean_education)
+def compute_aggregates(df):
+    # everything the page shows, computed once per version of the data
+    country_counts = df['Country'].value_counts()
 
-    return df
+    return {
+        'country_counts': country_counts,
+        'country_pie': render_pie(country_counts),
+        # mean salary by country, and by experience, sorted by the mean
+        'salary_by_country': df.groupby(['Country'], observed=True)['Salary'].mean().sort_values(ascending=True),
+        'salary_by_experience': df.groupby(['YearsCodePro'])['Salary'].mean().sort_values(ascending=True)
+        }
+
+
+def load_aggregates(years=None):
+    # the aggregates of the data, stored with it for all sessions, at the same version
+    name, version, _ = data_source(years)
+    return STORE.get(name + '-aggregates', version, lambda: compute_aggregates(load_data(years)))
 
-df = load_data()
 
 def show_explore_page():
+    # the surveys of several years if they were ingested (see survey_years.py), otherwise only SURVEY_FILE (2022)
+    years = dataset_years()
+    if years:
+        choice = st.sidebar.selectbox('Survey year', ['All years'] + [str(year) for year in reversed(years)], index=1)
+        selected_years = years if choice == 'All years' else [int(choice)]  # only these partitions are read
+        aggregates = load_aggregates(selected_years)
+        title = 'Stack Overflow Software Developer Surveys ' + (f'{years[0]}-{years[-1]}' if choice == 'All years' else choice)
+    else:
+        aggregates = load_aggregates()
+        title = 'Stack Overflow Software Developer Survey 2022'
+
     # --- Title stuffs
     st.title('Explore Salary Prediction')
 
-    st.write('''
-             ### Stack Overflow Software Developer Survey 2022
+    st.write(f'''
+             ### {title}
              ''')
 
     # --- Main Content
-    # get all data for each country
-    data = df['Country'].value_counts()
-
-    # - Pie-chart: of country counts
-    fig, ax = plt.subplots()
-
-    ax.pie(data, labels=data.index, autopct='%1.1f%%', shadow=True, startangle=90)  # nice looking arguments
-    ax.axis('equal')  # equal sized x and y
+    # every chart comes from the aggregates, computed once per version of the data (see compute_aggregates)
 
+    # - Pie-chart: of country counts, rendered once as a png
     st.write(''' Number of Data from different Countries
              ''')
 
-    st.pyplot(fig)  # calls plot
+    st.image(aggregates['country_pie'])
 
     # - Bar-chart: Mean salary by country
-    # format the data to plot
-    # get the salary vs country data
-    # then get the mean and sort accordingly
-    bar_chart_data = df.groupby(['Country'])['Salary']
-    bar_chart_data = bar_chart_data.mean().sort_values(ascending=True)
-
     st.write(''' Mean Salary by Country
              ''')
 
-    st.bar_chart(bar_chart_data)  # built in streamlit bar chart
+    st.bar_chart(aggregates['salary_by_country'])  # built in streamlit bar chart
 
     # - Line-cart: Mean salary by experience
-    # format the data to plot
-    # get the salary vs country data
-    # then get the mean and sort accordingly
-    line_chart_data = df.groupby(['YearsCodePro'])['Salary']
-    line_chart_data = line_chart_data.mean().sort_values(ascending=True)
-
     st.write(''' Mean Salary by Experience
              ''')
 
-    st.line_chart(line_chart_data)
+    st.line_chart(aggregates['salary_by_experience'])
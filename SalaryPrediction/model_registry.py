@@ -0,0 +1,175 @@
+# The salary model in use by every session of the app, replaced without a restart when it is retrained
+#
+# A background thread watches the model files (salary_model.npz, prediction_table.npz, or the older saved_steps.pkl)
+# when they change, the new model is loaded and validated in that thread: the arrays of the tree must make a valid tree
+# for the 3 features, and smoke predictions on every country and education of the prediction page must be sensible
+# Only then is it swapped in, as one assignment, so every session sees either the old or the new model, never a mix
+# A request takes the active model once (ModelRegistry.active()) and uses it to the end, so requests already running
+# finish on the old model, a model that fails validation is never used (the old one stays, and the error is kept)
+#
+# LIBRARIES: numpy (scikit-learn only for saved_steps.pkl)
+
+import collections
+import datetime
+import logging
+import pickle
+import threading
+import time
+
+import numpy as np
+
+from dataset_store import file_version
+from prediction_table import COUNTRIES, EDUCATIONS, MAX_EXPERIENCE, PARITY_TOLERANCE, TABLE_FILE, PredictionTable
+from tree_model import MODEL_FILE, TreeModel
+
+logger = logging.getLogger(__name__)
+
+PICKLE_FILE = 'saved_steps.pkl'  # the model of older versions of SalaryPrediction.py, used if there is no MODEL_FILE
+POLL_SECONDS = 5
+SMOKE_EXPERIENCES = [0, 1, 3, 10, 25, MAX_EXPERIENCE]
+MAX_SALARY = 10_000_000  # a smoke prediction above this (or not above 0) fails the validation
+
+# a validated model: version is the short checksum of the model, table is None if there is no (matching) table
+ActiveModel = collections.namedtuple('ActiveModel', ['version', 'model', 'table', 'loaded_at', 'files'])
+
+
+def read_model(model_path=MODEL_FILE, pickle_path=PICKLE_FILE):
+    ''' Returns the TreeModel of model_path, or else of the pickled model at pickle_path
+    '''
+
+    if file_version(model_path) is not None:
+        # read into memory, not memory-mapped: a mapped file can not be replaced on Windows, so retraining while the
+        # app runs would fail to save the new model (the arrays of a decision tree are small)
+        return TreeModel.load(model_path, mmap=False)
+
+    with open(pickle_path, 'rb') as file:
+        return TreeModel.from_sklearn(pickle.load(file))
+
+
+def check_schema(model):
+    ''' Raises ValueError if the arrays of model do not make a decision tree of the 3 features
+    '''
+
+    nodes = len(model.feature)
+    if nodes == 0 or any(len(array) != nodes for array in [model.threshold, model.children_left, model.children_right,
+                                                            model.value]):
+        raise ValueError('The arrays of the tree are empty or of different lengths')
+
+    leaves = model.children_left < 0
+    if not np.array_equal(leaves, model.children_right < 0):
+        raise ValueError('Nodes of the tree have a single child')
+
+    children = np.concatenate([model.children_left[~leaves], model.children_right[~leaves]])
+    if children.size and (children.min() <= 0 or children.max() >= nodes or len(np.unique(children)) != children.size):
+        raise ValueError('The children of the tree are out of range, or shared')
+    if np.any((model.feature[~leaves] < 0) | (model.feature[~leaves] > 2)):
+        raise ValueError('The tree splits on features other than country, education and experience')
+    if not np.all(np.isfinite(model.value)):
+        raise ValueError('The tree has leaves without a finite value')
+
+    for name, categories in [('countries', model.countries), ('educations', model.educations)]:
+        if len(categories) == 0 or np.any(categories[1:] <= categories[:-1]):
+            raise ValueError(f'The {name} of the model are empty or not sorted')
+
+
+def smoke_test(model, table):
+    ''' Returns table, or None if it does not match model, raises ValueError if the smoke predictions of model fail
+    the smoke predictions are every country and education of the prediction page known to model, at a few experiences
+    '''
+
+    keys = [(country, education, experience)
+            for country in COUNTRIES if country in set(model.countries)
+            for education in EDUCATIONS if education in set(model.educations)
+            for experience in SMOKE_EXPERIENCES]
+    if not keys:
+        raise ValueError('The model knows none of the countries or educations of the prediction page')
+
+    salaries = model.predict_salaries(*zip(*keys))
+    if not np.all((salaries > 0) & (salaries < MAX_SALARY)):
+        raise ValueError(f'The model predicts salaries out of range, from ${salaries.min():,.02f} to ${salaries.max():,.02f}')
+
+    if table is not None:
+        looked_up = np.array([table.lookup(*key) for key in keys], dtype=float)  # None (not in table) becomes NaN
+        if not np.all(np.abs(looked_up - salaries) <= PARITY_TOLERANCE):
+            logger.warning('The prediction table does not match the model (not exported yet?), it is not used')
+            return None
+
+    return table
+
+
+class ModelRegistry:
+    ''' The active model of the app (see ActiveModel), reloaded and validated in the background when its files change
+    '''
+
+    def __init__(self, model_path=MODEL_FILE, table_path=TABLE_FILE, pickle_path=PICKLE_FILE):
+        self.model_path = model_path
+        self.table_path = table_path
+        self.pickle_path = pickle_path
+        self.current = None  # the ActiveModel, replaced as a whole
+        self.last_error = None  # (time, message) of the last model that failed validation
+        self.lock = threading.Lock()  # one load at a time
+        self.watcher = None
+
+    def files(self):
+        return tuple(file_version(path) for path in [self.model_path, self.table_path, self.pickle_path])
+
+    def active(self):
+        ''' Returns the ActiveModel, loading it the first time, a request should call this once and use it to the end
+        raises ValueError (or OSError) if there was never a valid model to load
+        '''
+
+        current = self.current
+        if current is None:
+            self.reload()
+            current = self.current
+            if current is None:
+                raise ValueError(f'No valid model: {self.last_error[1]}')
+
+        return current
+
+    def reload(self):
+        ''' Loads and validates the model if its files changed, and swaps it in, returns True if it was swapped
+        '''
+
+        with self.lock:
+            files = self.files()
+            if self.current is not None and self.current.files == files:
+                return False
+
+            try:
+                model = read_model(self.model_path, self.pickle_path)
+                check_schema(model)
+                table = PredictionTable.load(self.table_path) if files[1] is not None else None
+                table = smoke_test(model, table)
+            except Exception as error:  # i.e. a half written file, or a bad model - the old model stays
+                self.last_error = (datetime.datetime.now(), f'{type(error).__name__}: {error}')
+                if self.current is not None:
+                    self.current = self.current._replace(files=files)  # not tried again until the files change again
+                logger.warning('Model %s failed validation: %s', self.model_path, self.last_error[1])
+                return False
+
+            self.current = ActiveModel(str(model.version)[:12], model, table, datetime.datetime.now(), files)
+            logger.info('Model %s is now active', self.current.version)
+            return True
+
+    def start_watching(self, poll_seconds=POLL_SECONDS):
+        ''' Starts a background thread reloading the model every poll_seconds if its files changed (only once)
+        '''
+
+        with self.lock:
+            if self.watcher is not None:
+                return
+
+            self.watcher = threading.Thread(target=self.watch, args=(poll_seconds,), daemon=True)
+            self.watcher.start()
+
+    def watch(self, poll_seconds):
+        ''' The loop of the watcher thread, errors are logged so a bad model does not stop it
+        '''
+
+        while True:
+            time.sleep(poll_seconds)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception('Reloading %s failed', self.model_path)
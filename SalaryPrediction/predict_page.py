@@ -1,24 +1,37 @@
+import io
+
 import streamlit as st
-import pickle
-import numpy as np
 
+from batch_predict import read_candidates, score_candidates, write_csv
+from model_registry import ModelRegistry
+from prediction_service import PredictionService
+from prediction_table import COUNTRIES, EDUCATIONS, MAX_EXPERIENCE, MIN_EXPERIENCE
 
-# load model from pkl file, assign accordingly
-def load_model():
-    with open('saved_steps.pkl', 'rb') as file:
-        data = pickle.load(file)
 
-    return data
+# the model of all sessions (see model_registry.py), validated and swapped in the background when it is retrained
+@st.experimental_singleton
+def load_registry():
+    registry = ModelRegistry()
+    registry.start_watching()
+    return registry
 
-data = load_model()
 
-regressor = data['model']
-le_country = data['le_country']
-le_education = data['le_education']
+# the predictions not in the table, of all sessions, batched by one worker thread (see prediction_service.py)
+@st.experimental_singleton
+def load_service():
+    return PredictionService().start()
 
 
 # the web page that will be shown for this section
 def show_predict_page():
+    # the model and table of this whole rerun, a model swapped in meanwhile is used from the next one
+    try:
+        active = load_registry().active()
+    except (OSError, ValueError) as error:
+        st.error(f'No model to predict with, run SalaryPrediction.py or train.py first ({error})')
+        return
+    table = active.table
+
     # --- Title stuffs
     st.title('Software Developer Salary Prediction')
 
@@ -28,44 +41,62 @@ def show_predict_page():
 
     # --- Main Content
     # assign the necessary groups to select
-    countries = (
-                'United States of America',
-                'Germany',
-                'United Kingdom of Great Britain and Northern Ireland',
-                'India',
-                'Canada',
-                'France',
-                'Brazil',
-                'Spain',
-                'Netherlands',
-                'Australia',
-                'Italy',
-                'Poland',
-                'Sweden',
-                'Russian Federation',
-                'Switzerland'
-                )
-
-    educations = (
-                'Less than a Bachelors',
-                'Bachelors',
-                'Masters',
-                'Post Grad'
-                )
+    countries = COUNTRIES
+    educations = EDUCATIONS
 
     country = st.selectbox('Country', countries)  # variable is assigned to the value selected from tuple or list
     education = st.selectbox('Education', educations)
 
-    experience = st.slider('Years of Experience', 0, 50, 3)  # variable assigned to value of slider; title, start, end, default
+    experience = st.slider('Years of Experience', MIN_EXPERIENCE, MAX_EXPERIENCE, 3)  # variable assigned to value of slider; title, start, end, default
 
     calculate_button = st.button('Calculate Salary')  # if user wants to get prediction, returns True if clicked
     if calculate_button:
-        # same prediction process as before
-        x = np.array([[country, education, experience]])
+        # every input of the page is in the table, the model is only needed without one (or for a different model)
+        salary = table.lookup(country, education, experience) if table is not None else None
+        try:
+            if salary is None:
+                salary = load_service().predict(active.model, country, education, experience)
+        except ValueError as error:  # the model was trained on surveys without answers from that country
+            st.error(str(error))
+        else:
+            st.write(f'Predicted Salary: ${salary:,.02f}')
+
+    # --- Batch prediction
+    # a whole file of candidates, predicted in chunks (see batch_predict.py), and downloaded as a csv
+    st.write('''
+             ### Or predict a file of candidates
+             A csv or parquet file with a Country, Education and Experience column
+             ''')
+
+    uploaded_file = st.file_uploader('Candidates', type=['csv', 'parquet'])
+    if uploaded_file is not None:
+        try:
+            candidates = read_candidates(uploaded_file, uploaded_file.name)
+            model = active.model
+
+            progress = st.progress(0)
+            output = io.BytesIO()
+
+            def chunks():
+                scored = 0
+                for chunk in score_candidates(candidates, model):
+                    scored += len(chunk)
+                    progress.progress(scored / len(candidates))
+                    yield chunk
 
-        x[:, 0] = le_country.transform(x[:, 0])
-        x[:, 1] = le_education.transform(x[:, 1])
-        x = x.astype(float)
+            rows, failed = write_csv(chunks(), output)
+        except ValueError as error:  # i.e. a missing column, or a file that is not a csv
+            st.error(str(error))
+        else:
+            progress.progress(1.0)
+            st.write(f'Predicted {rows - failed:,} of {rows:,} candidates' +
+                     (f', see the Error column for the other {failed:,}' if failed else ''))
+            st.download_button('Download predictions', output.getvalue(),
+                               file_name='predicted_' + uploaded_file.name.rsplit('.', 1)[0] + '.csv', mime='text/csv')
 
-        y_pred = regressor.predict(x)
-        st.write(f'Predicted Salary: ${float(y_pred):,.02f}')
\ No newline at end of file
+    st.caption(f'Model version {active.version}, active since {active.loaded_at:%Y-%m-%d %H:%M:%S}')
+    last_error = load_registry().last_error
+    if last_error is not None and last_error[0] > active.loaded_at:
+        st.caption(f'A newer model was not used, it failed validation: {last_error[1]}')
+    with st.expander('Prediction service'):
+        st.json(load_service().stats())
@@ -0,0 +1,172 @@
+# A prediction service batching the salary predictions of all sessions
+#
+# Predicting one salary at a time costs mostly the overhead of a call (encoding the inputs, building the arrays), not
+# the walk down the tree, so when many users predict at once the predictions are batched instead:
+# a request is put on a queue with a future, and a worker thread takes the requests queued within MAX_WAIT_SECONDS of
+# the first one (or MAX_BATCH of them), encodes and predicts them with one vectorized TreeModel.predict per model,
+# and sets the result of every future
+# A request carries the model it is predicted with (see model_registry.ActiveModel), so a batch can mix the requests
+# of sessions on the old and the new model while it is swapped, each is predicted with its own
+#
+# set the SALARY_BATCH_SIZE and SALARY_BATCH_WAIT_MS environment variables to change the limits of a batch
+# stats() gives the queue depth and the sizes of the batches, shown on the prediction page
+#
+# LIBRARIES: numpy
+
+import collections
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from tree_model import category_codes
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.environ.get('SALARY_BATCH_SIZE', '256'))  # requests predicted at once, at most
+MAX_WAIT_SECONDS = float(os.environ.get('SALARY_BATCH_WAIT_MS', '2')) / 1000  # wait for more requests, at most
+
+# a queued prediction, the result (the salary) or the error is set on future
+Request = collections.namedtuple('Request', ['model', 'country', 'education', 'experience', 'future'])
+
+
+class PredictionService:
+    ''' The queue of prediction requests, and the worker thread predicting them in batches
+    '''
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT_SECONDS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()  # of the counters and the worker
+        self.worker = None
+
+        self.counts = collections.Counter()  # 'requests', 'batches', 'errors'
+        self.batch_sizes = collections.Counter()  # {size rounded up to a power of 2: batches}
+        self.max_queue_depth = 0
+        self.last_batch_seconds = 0.0
+
+    def start(self):
+        ''' Starts the worker thread (only once), returns self
+        '''
+
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, name='prediction-service', daemon=True)
+                self.worker.start()
+
+        return self
+
+    def submit(self, model, country, education, experience):
+        ''' Queues the prediction of the salary with model (a TreeModel), returns its concurrent.futures.Future
+        the future raises ValueError for a country or education the model does not know
+        '''
+
+        future = concurrent.futures.Future()
+        self.requests.put(Request(model, country, education, experience, future))
+
+        depth = self.requests.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+        return future
+
+    def predict(self, model, country, education, experience, timeout=None):
+        ''' Returns the salary predicted by model, waiting for the batch it is predicted in
+        '''
+
+        return self.submit(model, country, education, experience).result(timeout)
+
+    def next_batch(self):
+        ''' Returns the requests of the next batch, waits for the first one, then up to max_wait for max_batch of them
+        '''
+
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # past the deadline, the requests already queued are still taken, without waiting
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def run(self):
+        ''' The loop of the worker thread, errors are set on the futures so the loop does not stop
+        '''
+
+        while True:
+            batch = self.next_batch()
+            start = time.perf_counter()
+
+            # the requests of one model are predicted together, and cancelled requests are skipped
+            by_model = {}
+            for request in batch:
+                if request.future.set_running_or_notify_cancel():
+                    by_model.setdefault(id(request.model), []).append(request)
+
+            for requests in by_model.values():
+                try:
+                    predict_batch(requests)
+                except Exception as error:
+                    logger.exception('Predicting a batch of %d requests failed', len(requests))
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(error)
+
+            with self.lock:
+                self.counts['requests'] += len(batch)
+                self.counts['batches'] += 1
+                self.counts['errors'] += sum(request.future.exception() is not None for request in batch
+                                             if not request.future.cancelled())
+                self.batch_sizes[1 << (len(batch) - 1).bit_length()] += 1
+                self.last_batch_seconds = time.perf_counter() - start
+
+    def stats(self):
+        ''' Returns the dict of the queue depth (now and at most) and the counts and sizes of the batches so far
+        '''
+
+        with self.lock:
+            batches = self.counts['batches']
+            return {
+                'queue_depth': self.requests.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.counts['requests'],
+                'errors': self.counts['errors'],
+                'batches': batches,
+                'mean_batch_size': self.counts['requests'] / batches if batches else 0.0,
+                'batch_sizes': {f'<={size}': count for size, count in sorted(self.batch_sizes.items())},
+                'last_batch_ms': self.last_batch_seconds * 1000,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000
+                }
+
+
+def predict_batch(requests):
+    ''' Predicts the requests (all of the same model) with one TreeModel.predict, and sets the result of their futures
+    requests of a country or education the model does not know get a ValueError, as TreeModel.predict_salaries raises
+    '''
+
+    model = requests[0].model
+    countries, unknown_countries = category_codes([request.country for request in requests], model.countries)
+    educations, unknown_educations = category_codes([request.education for request in requests], model.educations)
+    experiences = np.array([request.experience for request in requests], dtype=float)
+
+    known = ~(unknown_countries | unknown_educations)
+    salaries = np.full(len(requests), np.nan)
+    if known.any():
+        salaries[known] = model.predict(np.column_stack([countries, educations, experiences])[known])
+
+    for i, request in enumerate(requests):
+        if known[i]:
+            request.future.set_result(float(salaries[i]))
+        else:
+            label, value = ('country', request.country) if unknown_countries[i] else ('education', request.education)
+            request.future.set_exception(ValueError(f'Unknown {label}: {value}'))
@@ -0,0 +1,150 @@
+# A table of the predicted salary for every input of the prediction page
+#
+# The page's inputs are few: 15 countries x 4 educations x 51 years of experience (the slider, 0 to 50)
+# so the model is evaluated on all 3060 of them once, when it is trained (see SalaryPrediction.py), and the results
+# are saved next to it as a float32 array, the page then answers with an array lookup instead of running the model
+# Only numpy is needed to use the table, the model (and scikit-learn) only to build it, or for inputs not in the table
+#
+# LIBRARIES: numpy (scikit-learn to build the table)
+
+import os
+
+import numpy as np
+
+TABLE_FILE = 'prediction_table.npz'
+
+# the inputs of the prediction page
+COUNTRIES = (
+    'United States of America',
+    'Germany',
+    'United Kingdom of Great Britain and Northern Ireland',
+    'India',
+    'Canada',
+    'France',
+    'Brazil',
+    'Spain',
+    'Netherlands',
+    'Australia',
+    'Italy',
+    'Poland',
+    'Sweden',
+    'Russian Federation',
+    'Switzerland'
+    )
+
+EDUCATIONS = (
+    'Less than a Bachelors',
+    'Bachelors',
+    'Masters',
+    'Post Grad'
+    )
+
+MIN_EXPERIENCE = 0
+MAX_EXPERIENCE = 50
+
+PARITY_TOLERANCE = 0.01  # dollars, float32 keeps salaries of up to 250k to about a cent
+
+
+def model_predict(model, countries, educations, experiences):
+    ''' Returns the array of salaries predicted by model (the dict saved by SalaryPrediction.py) for the arrays of inputs
+    '''
+
+    x = np.column_stack([
+        model['le_country'].transform(np.asarray(countries)),
+        model['le_education'].transform(np.asarray(educations)),
+        np.asarray(experiences, dtype=float)
+        ]).astype(float)
+
+    return model['model'].predict(x)
+
+
+def table_inputs(model):
+    ''' Returns (countries, educations) of COUNTRIES and EDUCATIONS that model was trained on
+    a model trained on other survey years may not know all of them (see survey_years.py)
+    '''
+
+    return (tuple(country for country in COUNTRIES if country in set(model['le_country'].classes_)),
+            tuple(education for education in EDUCATIONS if education in set(model['le_education'].classes_)))
+
+
+def build_table(model):
+    ''' Returns the float32 array of the salaries predicted by model, indexed by [country, education, experience]
+    in the order of table_inputs(model), and years from MIN_EXPERIENCE
+    '''
+
+    countries, educations = table_inputs(model)
+    experiences = np.arange(MIN_EXPERIENCE, MAX_EXPERIENCE + 1)
+    grid = np.meshgrid(np.arange(len(countries)), np.arange(len(educations)), experiences, indexing='ij')
+
+    salaries = model_predict(model, np.array(countries)[grid[0].ravel()], np.array(educations)[grid[1].ravel()],
+                             grid[2].ravel())
+
+    return salaries.reshape(grid[0].shape).astype(np.float32)
+
+
+class PredictionTable:
+    ''' The salaries of build_table(), and the maps of the countries and educations to their index in it
+    '''
+
+    def __init__(self, salaries, countries=COUNTRIES, educations=EDUCATIONS, min_experience=MIN_EXPERIENCE):
+        self.salaries = salaries
+        self.countries = {country: i for i, country in enumerate(countries)}
+        self.educations = {education: i for i, education in enumerate(educations)}
+        self.min_experience = min_experience
+
+    @classmethod
+    def load(cls, path=TABLE_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['salaries'], tuple(data['countries']), tuple(data['educations']), int(data['min_experience']))
+
+    def save(self, path=TABLE_FILE):
+        # written to a temporary file first, so the app never reads a half written table
+        np.savez(
+            path + '.tmp.npz',
+            salaries=self.salaries,
+            countries=np.array(list(self.countries)),
+            educations=np.array(list(self.educations)),
+            min_experience=self.min_experience
+            )
+        os.replace(path + '.tmp.npz', path)
+
+    def lookup(self, country, education, experience):
+        ''' Returns the predicted salary, or None if the inputs are not in the table
+        '''
+
+        i = self.countries.get(country)
+        j = self.educations.get(education)
+        k = experience - self.min_experience
+        if i is None or j is None or k != int(k) or not 0 <= k < self.salaries.shape[2]:
+            return None
+
+        return float(self.salaries[i, j, int(k)])
+
+
+def check_parity(table, model):
+    ''' Returns the largest difference between the salaries of table and the ones predicted by model, over all of table
+    '''
+
+    keys = [(country, education, table.min_experience + k)
+            for country in table.countries for education in table.educations for k in range(table.salaries.shape[2])]
+    countries, educations, experiences = zip(*keys)
+
+    predicted = model_predict(model, countries, educations, experiences)
+    looked_up = np.array([table.lookup(*key) for key in keys])
+
+    return float(np.abs(predicted - looked_up).max())
+
+
+def export_table(model, path=TABLE_FILE):
+    ''' Builds the table of model and saves it to path, returns the table as loaded from path
+    raises ValueError if the saved table does not match the predictions of model
+    '''
+
+    PredictionTable(build_table(model), *table_inputs(model)).save(path)
+    table = PredictionTable.load(path)
+
+    difference = check_parity(table, model)
+    if difference > PARITY_TOLERANCE:
+        raise ValueError(f'The prediction table differs from the model by up to ${difference:,.02f}')
+
+    return table
@@ -0,0 +1,153 @@
+# A cache of the cleaned survey, shared by the training (train.py) and the explore page
+#
+# The preprocessing runs in stages, each cached as an uncompressed feather file in '.survey_cache' next to the survey:
+#   survey   the used columns and rows of the csv (see survey_data.read_survey)
+#   cleaned  the Country, EdLevel, YearsCodePro and Salary frame (see survey_data.clean_survey) and its categories
+# A stage's file is named by its key, a hash of the key of the stage before it, its own parameters, and the version of
+# its code, the survey stage's key starts from the sha256 of the csv itself (not its modification time)
+# So a different csv rebuilds everything, but other cleaning parameters (i.e. a country cutoff of 200) only rebuild
+# the cleaned stage, and stages of other parameters stay cached side by side
+#
+# LIBRARIES: pandas, pyarrow (optional, without it nothing is cached)
+
+import hashlib
+import json
+import os
+
+from survey_data import COUNTRY_CUTOFF, MAX_SALARY, MIN_SALARY, clean_survey, read_survey
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # no pyarrow, so no cache - every stage is built every time
+    feather = None
+
+CACHE_DIR = '.survey_cache'  # folder (next to the survey) holding the cached stages
+HASHES_FILE = 'hashes.json'  # {path: [size, mtime, sha256]}, so an unchanged csv is not hashed again
+MAX_STAGE_FILES = 4  # files kept per stage (of other csv's or parameters), the least recently used are removed
+
+# bump the version of a stage if its code changes the data it gives (it also rebuilds the stages after it)
+STAGE_VERSIONS = {'survey': 1, 'cleaned': 1}
+
+
+def file_hash(path, block_size=1 << 20):
+    ''' Returns the sha256 hex-digest of the file at path
+    the file is read in blocks so large surveys are not loaded into memory at once
+    '''
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def survey_hash(path, folder):
+    ''' Returns the sha256 of the survey at path, hashed again only if its size or modification time changed
+    '''
+
+    stat = os.stat(path)
+    hashes_path = os.path.join(folder, HASHES_FILE)
+
+    try:
+        with open(hashes_path, 'r') as file:
+            hashes = json.load(file)
+    except (OSError, ValueError):
+        hashes = {}
+
+    entry = hashes.get(os.path.abspath(path))
+    if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return entry[2]
+
+    hashes[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns, file_hash(path)]
+    if feather is not None:
+        os.makedirs(folder, exist_ok=True)
+        with open(hashes_path + '.tmp', 'w') as file:
+            json.dump(hashes, file)
+        os.replace(hashes_path + '.tmp', hashes_path)
+
+    return hashes[os.path.abspath(path)][2]
+
+
+def stage_key(stage, parent_key, **parameters):
+    ''' Returns the key of a stage, the hash of the key of the stage before it, its parameters and its code version
+    '''
+
+    text = json.dumps({'stage': stage, 'version': STAGE_VERSIONS[stage], 'parent': parent_key, 'parameters': parameters},
+                      sort_keys=True)
+
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_stage(folder, stage, key, build):
+    ''' Returns (dataframe, metadata dict) of the stage of key, from the cache, or else build() and caches its result
+    '''
+
+    if feather is None:
+        return build()
+
+    path = os.path.join(folder, f'{stage}-{key[:32]}.feather')
+    meta_path = path[:-len('.feather')] + '.json'
+
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        os.utime(meta_path)  # marks it as recently used
+        return feather.read_table(path, memory_map=True).to_pandas(), meta
+
+    df, meta = build()
+
+    # the metadata is written last, so a stage is only read back once both files are complete
+    os.makedirs(folder, exist_ok=True)
+    feather.write_feather(df.reset_index(drop=True), path + '.tmp', compression='uncompressed')
+    os.replace(path + '.tmp', path)
+    with open(meta_path + '.tmp', 'w') as file:
+        json.dump(meta, file)
+    os.replace(meta_path + '.tmp', meta_path)
+    remove_old_stages(folder, stage)
+
+    return df, meta
+
+
+def remove_old_stages(folder, stage):
+    ''' Deletes the files of the stage beyond the MAX_STAGE_FILES most recently used
+    '''
+
+    meta_files = sorted(
+        (file_name for file_name in os.listdir(folder) if file_name.startswith(stage + '-') and file_name.endswith('.json')),
+        key=lambda file_name: os.path.getmtime(os.path.join(folder, file_name)), reverse=True
+        )
+
+    for file_name in meta_files[MAX_STAGE_FILES:]:
+        for extension in ['.json', '.feather']:
+            try:
+                os.remove(os.path.join(folder, file_name[:-len('.json')] + extension))
+            except OSError:
+                pass
+
+
+def load_cleaned(path, country_cutoff=COUNTRY_CUTOFF, min_salary=MIN_SALARY, max_salary=MAX_SALARY):
+    ''' Returns (df, key) of the survey csv at path, df is the cleaned survey (see survey_data.clean_survey)
+    with df.attrs['categories'] the sorted {'Country': countries, 'EdLevel': educations} in it
+    key identifies the csv and the cleaning, for the caches of what is built from df (i.e. the features of train.py)
+    '''
+
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+
+    survey_key = stage_key('survey', survey_hash(path, folder))
+    cleaned_key = stage_key('cleaned', survey_key, country_cutoff=country_cutoff, min_salary=min_salary,
+                            max_salary=max_salary)
+
+    def build_survey():
+        return read_survey(path), {}
+
+    def build_cleaned():
+        survey, _ = cached_stage(folder, 'survey', survey_key, build_survey)
+        df = clean_survey(survey, country_cutoff, min_salary, max_salary)
+        categories = {column: sorted(df[column].astype(str).unique()) for column in ['Country', 'EdLevel']}
+        return df, {'categories': categories}
+
+    df, meta = cached_stage(folder, 'cleaned', cleaned_key, build_cleaned)
+    df.attrs['categories'] = meta['categories']
+
+    return df, cleaned_key
@@ -0,0 +1,127 @@
+# Cleaning of the Stack Overflow Software Developer Survey, shared by the training (SalaryPrediction.py) and the app
+#
+# Turns the raw survey into a dataframe of Country, EdLevel, YearsCodePro and Salary:
+# only full-time employees with a salary between 10k and 250k, from countries with at least 400 answers
+# Every step works on whole columns, the few distinct text values are classified once and looked up for every row
+#
+# The survey has about 79 columns, read_survey() reads only the 5 used, with the text columns as categoricals
+# and drops the rows without a full-time job or an answer while reading, so the full survey is never in memory
+#
+# LIBRARIES: pandas, numpy, pyarrow (optional, a faster multithreaded parser)
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # no pyarrow, so the survey is read by pandas in chunks
+    pa = None
+
+SURVEY_COLUMNS = ['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']
+EMPLOYMENT = 'Employed, full-time'
+COUNTRY_CUTOFF = 400  # at least this many answers from a country, or its rows are dropped
+MIN_SALARY = 10000
+MAX_SALARY = 250000  # salaries outside these are outliers
+
+# the answers of YearsCodePro that are not numbers
+EXPERIENCE_SENTINELS = {'More than 50 years': '50', 'Less than 1 year': '0.5'}
+
+# {text found in EdLevel: education}, the first one found wins, the rest are 'Less than a Bachelors'
+EDUCATION_LEVELS = {
+    'Bachelor’s degree (B.A., B.S., B.Eng., etc.)': 'Bachelors',
+    'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)': 'Masters',
+    'Other doctoral degree (Ph.D., Ed.D., etc.)': 'Post Grad'
+    }
+OTHER_EDUCATION = 'Less than a Bachelors'
+
+TEXT_COLUMNS = ['Country', 'EdLevel', 'YearsCodePro', 'Employment']  # read as categoricals, the rest as floats
+READ_CHUNK_ROWS = 20000  # rows read at a time without pyarrow
+
+
+def shorten_categories(categories, cutoff):
+    ''' Returns {category: category} for the categories counted at least cutoff times, and {category: 'Other'} for the rest
+    categories must be a pandas series of counts (i.e. value_counts()), cutoff must be an integer
+    '''
+
+    return dict(zip(categories.index, categories.index.where(categories.values >= cutoff, 'Other')))
+
+
+def by_value(series, function):
+    ''' Returns function applied to the distinct values of series, looked up for every row of series (NaN stays NaN)
+    function gets and returns a series of the distinct values, so a column of few distinct values is cleaned in one pass
+    '''
+
+    codes, values = pd.factorize(series)
+    cleaned = np.asarray(function(pd.Series(values, dtype=object)))
+
+    return pd.Series(pd.api.extensions.take(cleaned, codes, allow_fill=True), index=series.index, name=series.name)
+
+
+def clean_experience(years):
+    ''' Returns the series of YearsCodePro answers as floats, 'Less than 1 year' is 0.5 and 'More than 50 years' is 50
+    '''
+
+    return by_value(years, lambda values: pd.to_numeric(values.replace(EXPERIENCE_SENTINELS)).astype(float))
+
+
+def clean_education(ed_levels):
+    ''' Returns the series of EdLevel answers as one of the educations of EDUCATION_LEVELS (or 'Less than a Bachelors')
+    '''
+
+    return by_value(ed_levels, lambda values: np.select(
+        [values.str.contains(text, regex=False) for text in EDUCATION_LEVELS],
+        list(EDUCATION_LEVELS.values()),
+        default=OTHER_EDUCATION
+        ).astype(object))
+
+
+def read_survey(path):
+    ''' Returns the dataframe of the SURVEY_COLUMNS of the survey csv at path, with the text columns as categoricals
+    only the rows of full-time employees who answered all the columns are kept (the rows clean_survey() would drop first)
+    '''
+
+    if pa is not None:
+        table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+            include_columns=SURVEY_COLUMNS,
+            column_types={column: pa.dictionary(pa.int32(), pa.string()) if column in TEXT_COLUMNS else pa.float64()
+                          for column in SURVEY_COLUMNS},
+            strings_can_be_null=True
+            ))
+
+        keep = pc.equal(table['Employment'].cast(pa.string()), EMPLOYMENT)
+        for column in SURVEY_COLUMNS:
+            keep = pc.and_(keep, pc.is_valid(table[column]))
+
+        df = table.filter(pc.fill_null(keep, False)).to_pandas()  # dictionary columns become categoricals
+    else:
+        chunks = pd.read_csv(path, usecols=SURVEY_COLUMNS, dtype={column: object for column in TEXT_COLUMNS},
+                             chunksize=READ_CHUNK_ROWS)
+        df = pd.concat([chunk[chunk['Employment'] == EMPLOYMENT].dropna() for chunk in chunks])
+        df = df.astype({column: 'category' for column in TEXT_COLUMNS})
+
+    for column in TEXT_COLUMNS:  # categories of the dropped rows
+        df[column] = df[column].cat.remove_unused_categories()
+
+    return df.reset_index(drop=True)[SURVEY_COLUMNS]
+
+
+def clean_survey(df, country_cutoff=COUNTRY_CUTOFF, min_salary=MIN_SALARY, max_salary=MAX_SALARY):
+    ''' Returns the cleaned dataframe of Country, EdLevel, YearsCodePro and Salary of the raw survey df
+    '''
+
+    df = df[SURVEY_COLUMNS].rename({'ConvertedCompYearly': 'Salary'}, axis=1)
+    df = df[df['Salary'].notna() & (df['Employment'] == EMPLOYMENT)].dropna()  # the cheap filters first, on every row
+    df = df.drop('Employment', axis=1)
+
+    # the countries are counted before the salary outliers are removed
+    counts = df['Country'].value_counts()
+    kept_countries = counts.index[(counts.values >= country_cutoff) & (counts.index != 'Other')]
+    df = df[df['Country'].isin(kept_countries) & df['Salary'].between(min_salary, max_salary)]
+    if isinstance(df['Country'].dtype, pd.CategoricalDtype):  # so the charts and counts show only the kept countries
+        df = df.assign(Country=df['Country'].cat.remove_unused_categories())
+
+    df = df.assign(YearsCodePro=clean_experience(df['YearsCodePro']), EdLevel=clean_education(df['EdLevel']))
+
+    return df
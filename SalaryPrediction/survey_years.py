@@ -0,0 +1,247 @@
+# Several years of the Stack Overflow survey, as one dataset partitioned by year
+#
+# Each year's csv is read in chunks (so the memory used does not grow with the size or number of surveys), its columns
+# are renamed to the ones of the 2022 survey (i.e. ConvertedComp was renamed ConvertedCompYearly in 2021), as are the
+# answers worded differently (i.e. 'United States' became 'United States of America' in 2021), and every chunk is
+# cleaned with the rules of survey_data.py and appended to the year's partition:
+#   survey_dataset/year=2021/part-00000.feather, part-00001.feather, ..., meta.json
+# The country cutoff counts all the answers of a year, so the counts are summed over the chunks, and the countries kept
+# are saved in meta.json and applied when the partition is read
+# read_years() only reads the partitions of the years asked for
+#
+# put the surveys next to this file as survey_results_public_<year>.csv (or the 2022 one as survey_results_public.csv)
+# and ingest them, from the SalaryPrediction folder: 'python survey_years.py', only new or changed surveys are read
+#
+# LIBRARIES: pandas, numpy, pyarrow
+
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+
+import pandas as pd
+
+from survey_cache import file_hash
+from survey_data import (COUNTRY_CUTOFF, EMPLOYMENT, MAX_SALARY, MIN_SALARY, SURVEY_COLUMNS, clean_education,
+                         clean_experience, shorten_categories)
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # no pyarrow, so no dataset - the explore page shows the single survey of survey_cache.py
+    feather = None
+
+DATASET_DIR = 'survey_dataset'
+CHUNK_ROWS = 20000  # rows of the csv read (and written) at a time
+DATASET_VERSION = 2  # bump this if the partitions written change, all surveys are then ingested again
+
+# {year: {column of SURVEY_COLUMNS: column in that year's csv}}, for the columns renamed since
+YEAR_COLUMNS = {
+    2019: {'ConvertedCompYearly': 'ConvertedComp'},
+    2020: {'ConvertedCompYearly': 'ConvertedComp'}
+    }
+
+# {year: the Employment answer of a full-time employee}, for the years it is not survey_data.EMPLOYMENT
+YEAR_EMPLOYMENT = {
+    2019: 'Employed full-time',
+    2020: 'Employed full-time',
+    2021: 'Employed full-time'
+    }
+
+# {year: {column: {answer in that year's csv: the same answer in 2022}}}, for the answers worded differently since
+# so the countries of every year are counted (and predicted) as one, and the educations match survey_data.EDUCATION_LEVELS
+YEAR_VALUES = {
+    2019: {
+        'Country': {
+            'United States': 'United States of America',
+            'United Kingdom': 'United Kingdom of Great Britain and Northern Ireland'
+            },
+        'EdLevel': {
+            'Bachelor’s degree (BA, BS, B.Eng., etc.)': 'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+            'Master’s degree (MA, MS, M.Eng., MBA, etc.)': 'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+            'Other doctoral degree (Ph.D, Ed.D., etc.)': 'Other doctoral degree (Ph.D., Ed.D., etc.)'
+            }
+        },
+    2020: {
+        'Country': {
+            'United States': 'United States of America',
+            'United Kingdom': 'United Kingdom of Great Britain and Northern Ireland'
+            }
+        }
+    }
+
+
+def survey_files(folder='.'):
+    ''' Returns {year: path} of the surveys in folder, survey_results_public_<year>.csv, and the 2022 survey as
+    survey_results_public.csv (the file the app used before it knew of other years)
+    '''
+
+    files = {}
+    for path in glob.glob(os.path.join(folder, 'survey_results_public_*.csv')):
+        match = re.fullmatch(r'survey_results_public_(\d{4})\.csv', os.path.basename(path))
+        if match:
+            files[int(match.group(1))] = path
+
+    if 2022 not in files and os.path.exists(os.path.join(folder, 'survey_results_public.csv')):
+        files[2022] = os.path.join(folder, 'survey_results_public.csv')
+
+    return dict(sorted(files.items()))
+
+
+def partition_folder(year, dataset_dir=DATASET_DIR):
+    return os.path.join(dataset_dir, f'year={year}')
+
+
+def read_meta(year, dataset_dir=DATASET_DIR):
+    ''' Returns the meta.json dict of the year's partition, or None if it was not (completely) ingested
+    '''
+
+    try:
+        with open(os.path.join(partition_folder(year, dataset_dir), 'meta.json'), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def survey_chunks(path, year, chunk_rows=CHUNK_ROWS):
+    ''' Yields the chunks of the survey csv at path, with the SURVEY_COLUMNS of that year renamed as in 2022
+    '''
+
+    renamed = {column: YEAR_COLUMNS.get(year, {}).get(column, column) for column in SURVEY_COLUMNS}
+    chunks = pd.read_csv(path, usecols=list(renamed.values()), dtype={renamed['ConvertedCompYearly']: float},
+                         chunksize=chunk_rows)
+
+    for chunk in chunks:
+        yield chunk.rename({source: column for column, source in renamed.items()}, axis=1)[SURVEY_COLUMNS]
+
+
+def clean_chunk(chunk, year, min_salary=MIN_SALARY, max_salary=MAX_SALARY):
+    ''' Returns (cleaned chunk, country counts) of a chunk of the survey of year, its answers worded as in 2022
+    the counts are of the answers before the salary outliers are removed, as the country cutoff of clean_survey
+    the countries are not cut off yet, that needs the counts of the whole year
+    '''
+
+    df = chunk.rename({'ConvertedCompYearly': 'Salary'}, axis=1)
+    df = df.assign(**{column: df[column].replace(values) for column, values in YEAR_VALUES.get(year, {}).items()})
+    df = df[df['Salary'].notna() & (df['Employment'] == YEAR_EMPLOYMENT.get(year, EMPLOYMENT))].dropna()
+    df = df.drop('Employment', axis=1)
+
+    counts = df['Country'].value_counts()
+
+    df = df[df['Salary'].between(min_salary, max_salary)]
+    df = df.assign(YearsCodePro=clean_experience(df['YearsCodePro']), EdLevel=clean_education(df['EdLevel']))
+
+    return df, counts
+
+
+def ingest_year(path, year, dataset_dir=DATASET_DIR, country_cutoff=COUNTRY_CUTOFF, min_salary=MIN_SALARY,
+                max_salary=MAX_SALARY, chunk_rows=CHUNK_ROWS):
+    ''' Writes the partition of the survey of year at path, one cleaned chunk at a time, returns its meta dict
+    '''
+
+    folder = partition_folder(year, dataset_dir)
+    tmp_folder = folder + '.tmp'
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    counts = pd.Series(dtype='int64')
+    parts = []
+    rows = 0
+    for i, chunk in enumerate(survey_chunks(path, year, chunk_rows)):
+        df, chunk_counts = clean_chunk(chunk, year, min_salary, max_salary)
+        counts = counts.add(chunk_counts, fill_value=0)
+
+        part = f'part-{i:05d}.feather'
+        feather.write_feather(df.reset_index(drop=True), os.path.join(tmp_folder, part), compression='uncompressed')
+        parts.append(part)
+        rows += len(df)
+
+    country_map = shorten_categories(counts.sort_values(ascending=False), country_cutoff)
+    meta = {
+        'year': year,
+        'version': DATASET_VERSION,
+        'source': os.path.abspath(path),
+        'size': os.stat(path).st_size,
+        'mtime_ns': os.stat(path).st_mtime_ns,
+        'sha256': file_hash(path),
+        'parameters': {'country_cutoff': country_cutoff, 'min_salary': min_salary, 'max_salary': max_salary},
+        'countries': sorted(country for country, kept in country_map.items() if kept != 'Other'),
+        'parts': parts,
+        'rows': rows
+        }
+    with open(os.path.join(tmp_folder, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+
+    # the finished partition replaces the old one, a reader sees either one or the other (see read_meta)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(tmp_folder, folder)
+
+    return meta
+
+
+def ingest(folder='.', dataset_dir=DATASET_DIR, **parameters):
+    ''' Ingests the surveys in folder (see survey_files) that are new or changed, returns {year: meta} of them
+    '''
+
+    ingested = {}
+    for year, path in survey_files(folder).items():
+        meta = read_meta(year, dataset_dir)
+        stat = os.stat(path)
+        if (meta is not None and meta['version'] == DATASET_VERSION and meta['size'] == stat.st_size
+                and meta['mtime_ns'] == stat.st_mtime_ns and all(meta['parameters'][k] == v for k, v in parameters.items())):
+            continue
+
+        meta = ingest_year(path, year, dataset_dir, **parameters)
+        ingested[year] = meta
+
+    return ingested
+
+
+def dataset_years(dataset_dir=DATASET_DIR):
+    ''' Returns the sorted list of the years in the dataset
+    '''
+
+    if feather is None or not os.path.isdir(dataset_dir):
+        return []
+
+    years = [int(name[len('year='):]) for name in os.listdir(dataset_dir) if re.fullmatch(r'year=\d{4}', name)]
+    return sorted(year for year in years if read_meta(year, dataset_dir) is not None)
+
+
+def dataset_version(years, dataset_dir=DATASET_DIR):
+    ''' Returns a version of the partitions of years, which changes when any of them is ingested again
+    from another csv, with other parameters, or by another DATASET_VERSION
+    '''
+
+    metas = [read_meta(year, dataset_dir) or {} for year in years]
+    return tuple((year, meta.get('version'), meta.get('sha256'), json.dumps(meta.get('parameters'), sort_keys=True))
+                 for year, meta in zip(years, metas))
+
+
+def read_years(years, dataset_dir=DATASET_DIR):
+    ''' Returns the cleaned survey (as survey_data.clean_survey) of the years, with a 'year' column
+    only the partitions of those years are read
+    '''
+
+    frames = []
+    for year in years:
+        meta = read_meta(year, dataset_dir)
+        if meta is None:
+            raise ValueError(f'The survey of {year} is not in {dataset_dir}, see survey_years.py')
+
+        folder = partition_folder(year, dataset_dir)
+        for part in meta['parts']:
+            df = feather.read_table(os.path.join(folder, part), memory_map=True).to_pandas()
+            frames.append(df[df['Country'].isin(meta['countries'])].assign(year=year))
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['Country', 'EdLevel', 'YearsCodePro', 'Salary', 'year'])
+    df['Country'] = df['Country'].astype('category')
+    df['year'] = df['year'].astype('int16')
+
+    return df
+
+
+if __name__ == '__main__':
+    for year, meta in ingest(sys.argv[1] if len(sys.argv) > 1 else '.').items():
+        print(f'{year}: {meta["rows"]:,} rows, {len(meta["parts"])} parts, {len(meta["countries"])} countries')
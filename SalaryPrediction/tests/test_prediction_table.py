@@ -0,0 +1,78 @@
+# Parity of the prediction table (see prediction_table.py) with the model it was built from
+#
+# Every input of the prediction page, 15 countries x 4 educations x 51 years of experience, is looked up in the table
+# and predicted by the model, and the two must agree to PARITY_TOLERANCE
+# for the exported model of this folder (salary_model.npz and prediction_table.npz), and for a table built from a
+# scikit-learn model trained on a synthetic survey
+#
+# run from the SalaryPrediction folder: 'python -m pytest tests'
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FOLDER)  # so the app modules can be imported
+sys.path.insert(0, os.path.join(FOLDER, 'benchmarks'))
+
+from prediction_table import (COUNTRIES, EDUCATIONS, MAX_EXPERIENCE, MIN_EXPERIENCE, PARITY_TOLERANCE, TABLE_FILE,
+                              PredictionTable, check_parity, export_table, model_predict)
+from tree_model import MODEL_FILE, TreeModel
+
+
+def full_grid():
+    ''' Returns the (countries, educations, experiences) arrays of every input of the prediction page
+    '''
+
+    grid = [(country, education, experience)
+            for country in COUNTRIES for education in EDUCATIONS
+            for experience in range(MIN_EXPERIENCE, MAX_EXPERIENCE + 1)]
+    return tuple(np.array(values) for values in zip(*grid))
+
+
+def test_exported_table_covers_the_page():
+    table = PredictionTable.load(os.path.join(FOLDER, TABLE_FILE))
+
+    assert table.salaries.shape == (len(COUNTRIES), len(EDUCATIONS), MAX_EXPERIENCE - MIN_EXPERIENCE + 1)
+    assert set(table.countries) == set(COUNTRIES)
+    assert set(table.educations) == set(EDUCATIONS)
+
+
+def test_exported_table_matches_exported_model():
+    table = PredictionTable.load(os.path.join(FOLDER, TABLE_FILE))
+    model = TreeModel.load(os.path.join(FOLDER, MODEL_FILE), mmap=False)
+    countries, educations, experiences = full_grid()
+
+    looked_up = np.array([table.lookup(*key) for key in zip(countries, educations, experiences)], dtype=float)
+    predicted = model.predict_salaries(countries, educations, experiences)
+
+    assert len(looked_up) == 15 * 4 * 51
+    assert np.all(np.abs(looked_up - predicted) <= PARITY_TOLERANCE)
+
+
+def test_built_table_matches_sklearn_model(tmp_path):
+    pytest.importorskip('sklearn')
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.tree import DecisionTreeRegressor
+
+    from survey_data import clean_survey
+    from synthetic_survey import survey
+
+    df = clean_survey(survey(50000), country_cutoff=1)  # every country of the page, however few its answers
+    le_country = LabelEncoder().fit(df['Country'].astype(str))
+    le_education = LabelEncoder().fit(df['EdLevel'].astype(str))
+    x = np.column_stack([le_country.transform(df['Country'].astype(str)),
+                         le_education.transform(df['EdLevel'].astype(str)),
+                         df['YearsCodePro'].values]).astype(float)
+    model = {'model': DecisionTreeRegressor(max_depth=12, random_state=0).fit(x, df['Salary'].values),
+             'le_country': le_country, 'le_education': le_education}
+
+    table = export_table(model, str(tmp_path / TABLE_FILE))
+    assert table.salaries.shape == (len(COUNTRIES), len(EDUCATIONS), MAX_EXPERIENCE - MIN_EXPERIENCE + 1)
+    assert check_parity(table, model) <= PARITY_TOLERANCE
+
+    countries, educations, experiences = full_grid()
+    looked_up = np.array([table.lookup(*key) for key in zip(countries, educations, experiences)], dtype=float)
+    assert np.all(np.abs(looked_up - model_predict(model, countries, educations, experiences)) <= PARITY_TOLERANCE)
@@ -0,0 +1,218 @@
+# Training of the salary model from the command line, without streamlit
+#
+# The same model as SalaryPrediction.py (a DecisionTreeRegressor on Country, EdLevel and YearsCodePro), but:
+# - the hyperparameters are searched with a parallel GridSearchCV, over a grid that can be given on the command line
+# - the model is scored on a held-out test set, not on the data it was trained on
+# - the cleaned survey (see survey_cache.py) and the encoded feature matrix are cached, so retraining skips the preprocessing
+# The model is saved like SalaryPrediction.py does (saved_steps.pkl, salary_model.npz and prediction_table.npz)
+# and training_report.json next to them has the timing of every stage and the metrics
+#
+# run from the SalaryPrediction folder: 'python train.py'
+# or with another grid: 'python train.py --grid "{\"max_depth\": [8, 10, 12], \"min_samples_leaf\": [1, 5, 20]}"'
+#
+# LIBRARIES: scikit-learn, pandas, numpy, pyarrow (optional, reads the survey faster)
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeRegressor
+
+from prediction_table import export_table
+from survey_cache import load_cleaned
+from survey_data import COUNTRY_CUTOFF, MAX_SALARY, MIN_SALARY
+from survey_years import dataset_version, read_meta, read_years
+from tree_model import export_model
+
+SURVEY_FILE = 'survey_results_public.csv'
+FEATURES_FILE = 'features_cache.npz'  # the cached feature matrix, in the output folder
+REPORT_FILE = 'training_report.json'
+
+FEATURES_VERSION = 1  # bump this if build_features changes the feature matrix
+
+PARAMETER_GRID = {'max_depth': [None, 2, 4, 6, 8, 10, 12]}
+
+
+@contextmanager
+def stage(timings, name):
+    ''' Times the code in the with block as timings[name], in seconds
+    '''
+
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def read_features(path, key):
+    ''' Returns (X, y, countries, educations) cached at path, or None if there is none or it is not of key
+    '''
+
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path, allow_pickle=False) as data:
+        if str(data['key']) != key:
+            return None
+        return data['X'], data['y'], data['countries'], data['educations']
+
+
+def build_features(df):
+    ''' Returns (X, y, countries, educations) of the cleaned survey df (see survey_cache.load_cleaned), X is the float
+    array of the encoded (Country, EdLevel, YearsCodePro), y the salaries, countries and educations the sorted
+    categories of the encoding
+    '''
+
+    countries = np.array(df.attrs['categories']['Country'])
+    educations = np.array(df.attrs['categories']['EdLevel'])
+    X = np.column_stack([
+        label_encoder(countries).transform(df['Country'].astype(str)),
+        label_encoder(educations).transform(df['EdLevel'].astype(str)),
+        df['YearsCodePro'].values
+        ]).astype(float)
+
+    return X, df['Salary'].values.astype(float), countries, educations
+
+
+def label_encoder(classes):
+    ''' Returns a fitted LabelEncoder of the sorted classes
+    '''
+
+    encoder = LabelEncoder()
+    encoder.classes_ = np.asarray(classes, dtype=object)
+    return encoder
+
+
+def errors(y, y_pred):
+    ''' Returns the dict of the root mean squared error and mean absolute error of the predictions y_pred
+    '''
+
+    return {'rmse': float(np.sqrt(mean_squared_error(y, y_pred))), 'mae': float(mean_absolute_error(y, y_pred))}
+
+
+def train(survey_file=SURVEY_FILE, output_dir='.', grid=None, test_size=0.2, cv=5, n_jobs=-1, random_state=0,
+          use_cache=True, country_cutoff=COUNTRY_CUTOFF, min_salary=MIN_SALARY, max_salary=MAX_SALARY, years=None):
+    ''' Trains and saves the salary model in output_dir, returns the report (also saved as REPORT_FILE)
+    with years, trains on those years of the dataset of several surveys (see survey_years.py) instead of survey_file
+    their partitions are already cleaned, with the parameters they were ingested with (reported instead of
+    country_cutoff, min_salary and max_salary, which are not used then)
+    '''
+
+    grid = grid if grid is not None else PARAMETER_GRID
+    os.makedirs(output_dir, exist_ok=True)
+    timings = {}
+
+    # - Features, the cleaned survey from the cache shared with the explore page (see survey_cache.py)
+    # and the feature matrix from its own cache, if the survey and the cleaning are the same as when it was saved
+    with stage(timings, 'cleaning'):
+        if years:
+            df = read_years(years)
+            df.attrs['categories'] = {column: sorted(df[column].astype(str).unique()) for column in ['Country', 'EdLevel']}
+            cleaned_key = hashlib.sha256(json.dumps(dataset_version(years)).encode('utf-8')).hexdigest()
+        else:
+            df, cleaned_key = load_cleaned(survey_file, country_cutoff, min_salary, max_salary)
+
+    features_path = os.path.join(output_dir, FEATURES_FILE)
+    key = f'{cleaned_key}-{FEATURES_VERSION}'
+
+    with stage(timings, 'features'):
+        features = read_features(features_path, key) if use_cache else None
+        cached = features is not None
+        if not cached:
+            features = build_features(df)
+            np.savez(features_path, key=np.array(key), **dict(zip(['X', 'y', 'countries', 'educations'], features)))
+        X, y, countries, educations = features
+
+    with stage(timings, 'split'):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    # - Models, a linear regression as the baseline, and the decision tree of the best hyperparameters
+    with stage(timings, 'linear_regression'):
+        linear_reg = LinearRegression().fit(X_train, y_train)
+
+    with stage(timings, 'grid_search'):
+        # refit (the default) fits the best estimator on the whole training set, so it is ready to use
+        gs = GridSearchCV(DecisionTreeRegressor(random_state=random_state), grid, scoring='neg_mean_squared_error',
+                          cv=cv, n_jobs=n_jobs)
+        gs.fit(X_train, y_train)
+        regressor = gs.best_estimator_
+
+    with stage(timings, 'evaluation'):
+        metrics = {
+            'linear_regression': errors(y_test, linear_reg.predict(X_test)),
+            'decision_tree': errors(y_test, regressor.predict(X_test)),
+            'decision_tree_train': errors(y_train, regressor.predict(X_train)),
+            'cv_rmse': float(np.sqrt(-gs.best_score_))
+            }
+
+    # - Save the model, as SalaryPrediction.py does
+    with stage(timings, 'export'):
+        data = {'model': regressor, 'le_country': label_encoder(countries), 'le_education': label_encoder(educations)}
+        with open(os.path.join(output_dir, 'saved_steps.pkl'), 'wb') as file:
+            pickle.dump(data, file)
+        export_model(data, X_test, os.path.join(output_dir, 'salary_model.npz'))
+        export_table(data, os.path.join(output_dir, 'prediction_table.npz'))
+
+    # the partitions of years were cleaned when they were ingested, with the parameters in their meta.json
+    if years:
+        cleaning = {year: read_meta(year)['parameters'] for year in years}
+    else:
+        cleaning = {'country_cutoff': country_cutoff, 'min_salary': min_salary, 'max_salary': max_salary}
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'survey': survey_file if not years else years,
+        'rows': {'train': len(X_train), 'test': len(X_test)},
+        'cleaning': cleaning,
+        'features_cached': cached,
+        'grid': grid,
+        'best_parameters': gs.best_params_,
+        'metrics': metrics,
+        'timings': timings
+        }
+    with open(os.path.join(output_dir, REPORT_FILE), 'w') as file:
+        json.dump(report, file, indent=2)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trains the salary model on the Stack Overflow survey')
+    parser.add_argument('--survey', default=SURVEY_FILE, help='survey csv to train on')
+    parser.add_argument('--years', type=int, nargs='+', help='train on these years of the ingested surveys instead')
+    parser.add_argument('--output-dir', default='.', help='folder to save the model, report and feature cache to')
+    parser.add_argument('--grid', type=json.loads, default=None,
+                        help='json of {DecisionTreeRegressor parameter: list of values} to search, default: '
+                             + json.dumps(PARAMETER_GRID))
+    parser.add_argument('--test-size', type=float, default=0.2, help='fraction of the rows held out for the test')
+    parser.add_argument('--cv', type=int, default=5, help='folds of the cross-validation')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='parallel jobs of the grid search, -1 uses every core')
+    parser.add_argument('--random-state', type=int, default=0)
+    parser.add_argument('--no-cache', action='store_true', help='rebuild the feature matrix even if it is cached')
+    parser.add_argument('--country-cutoff', type=int, default=COUNTRY_CUTOFF, help='answers needed to keep a country (not with --years, the surveys were cleaned when ingested)')
+    parser.add_argument('--min-salary', type=float, default=MIN_SALARY)
+    parser.add_argument('--max-salary', type=float, default=MAX_SALARY)
+    args = parser.parse_args()
+
+    report = train(args.survey, args.output_dir, args.grid, args.test_size, args.cv, args.n_jobs, args.random_state,
+                   use_cache=not args.no_cache, country_cutoff=args.country_cutoff, min_salary=args.min_salary,
+                   max_salary=args.max_salary, years=args.years)
+
+    print(f'best parameters: {report["best_parameters"]}')
+    for model, scores in report['metrics'].items():
+        scores = scores if isinstance(scores, dict) else {'rmse': scores}
+        print(f'{model:<20} ' + ', '.join(f'{name} ${value:,.02f}' for name, value in scores.items()))
+    print('timings: ' + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in report['timings'].items()))
+
+
+if __name__ == '__main__':
+    main()
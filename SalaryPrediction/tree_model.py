@@ -0,0 +1,195 @@
+# The salary model as plain numpy arrays, saved to a versioned .npz file instead of a pickle
+#
+# The decision tree of SalaryPrediction.py is saved as flat arrays (the feature and threshold of every node, its
+# children, and the value of the leaves) with the categories of the two LabelEncoders, a format version and a checksum
+# Loading it needs only numpy (no scikit-learn, of no particular version), runs no code from the file, and the arrays
+# can be memory-mapped from the uncompressed .npz, so every process using them shares the same pages of memory
+# The app reads them into memory instead (see model_registry.py), a mapped file can not be replaced on Windows
+#
+# LIBRARIES: numpy (scikit-learn to export the model)
+
+import hashlib
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+MODEL_FILE = 'salary_model.npz'
+FORMAT_VERSION = 1  # bump this if the arrays saved change
+
+# the arrays of the file, in the order they are hashed for the checksum
+ARRAYS = ['feature', 'threshold', 'children_left', 'children_right', 'value', 'countries', 'educations']
+
+
+def checksum(arrays):
+    ''' Returns the sha256 (hex) of the arrays of ARRAYS in the dict arrays
+    '''
+
+    digest = hashlib.sha256()
+    for name in ARRAYS:
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f'{name}:{array.dtype.str}:{array.shape}'.encode('utf-8'))
+        digest.update(array.tobytes())
+
+    return digest.hexdigest()
+
+
+def read_npz(path, mmap=True):
+    ''' Returns {name: array} of the .npz file at path
+    with mmap, the arrays of an uncompressed .npz (as np.savez writes) are memory-mapped instead of read
+    '''
+
+    if not mmap:
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    arrays = {}
+    with open(path, 'rb') as file, zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path} is compressed, it can not be memory-mapped')
+
+            # the data of the member follows its local header (30 bytes, the name, and the extra field)
+            file.seek(info.header_offset)
+            local_header = file.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+
+            # then the .npy header, then the array itself
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+            if dtype.hasobject:
+                raise ValueError(f'{path} holds python objects, which are not loaded')
+
+            arrays[info.filename[:-len('.npy')]] = np.memmap(
+                path, dtype=dtype, mode='r', offset=file.tell(), shape=shape, order='F' if fortran_order else 'C'
+                ).view(np.ndarray)  # still backed by the mapped file, without the overhead of np.memmap on indexing
+
+    return arrays
+
+
+class TreeModel:
+    ''' A decision tree regressor of flat arrays, with the categories of the countries and educations
+    predicts the same salaries as the scikit-learn model it was exported from
+    '''
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.value = arrays['value']
+        self.countries = arrays['countries']  # the sorted classes of the LabelEncoders, a category's index is its code
+        self.educations = arrays['educations']
+        self.version = arrays.get('checksum')
+
+    @classmethod
+    def from_sklearn(cls, model):
+        ''' Returns the TreeModel of model, the dict of the regressor and LabelEncoders saved by SalaryPrediction.py
+        '''
+
+        tree = model['model'].tree_
+        arrays = {
+            'feature': tree.feature.astype(np.int32),
+            'threshold': tree.threshold.astype(np.float64),
+            'children_left': tree.children_left.astype(np.int32),
+            'children_right': tree.children_right.astype(np.int32),
+            'value': tree.value[:, 0, 0].astype(np.float64),
+            'countries': np.asarray(model['le_country'].classes_).astype(str),
+            'educations': np.asarray(model['le_education'].classes_).astype(str)
+            }
+        arrays['checksum'] = np.array(checksum(arrays))
+
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path=MODEL_FILE, mmap=True):
+        ''' Returns the TreeModel saved at path
+        raises ValueError if the file is of another format version, or its checksum does not match its arrays
+        '''
+
+        arrays = read_npz(path, mmap)
+
+        format_version = int(arrays['format_version'])
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f'{path} is of format version {format_version}, only version {FORMAT_VERSION} can be loaded')
+        if str(arrays['checksum']) != checksum(arrays):
+            raise ValueError(f'{path} is corrupted, its checksum does not match')
+
+        return cls(arrays)
+
+    def save(self, path=MODEL_FILE):
+        # written to a temporary file first, so the app (see model_registry.py) never reads a half written model
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        np.savez(path + '.tmp.npz', format_version=np.array(FORMAT_VERSION), checksum=np.array(checksum(arrays)), **arrays)
+        os.replace(path + '.tmp.npz', path)
+
+    def predict(self, x):
+        ''' Returns the predicted salaries of x, the array of rows of (country code, education code, experience)
+        '''
+
+        # scikit-learn compares the features as float32 with the float64 thresholds, so the same is done here
+        x = np.asarray(x, dtype=np.float32).astype(np.float64).reshape(-1, 3)
+        nodes = np.zeros(len(x), dtype=np.int64)
+
+        # move the rows not at a leaf (a node without children) down the tree, one level at a time
+        active = np.flatnonzero(self.children_left[nodes] >= 0)
+        while len(active):
+            current = nodes[active]
+            go_left = x[active, self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.children_left[current], self.children_right[current])
+            active = active[self.children_left[nodes[active]] >= 0]
+
+        return self.value[nodes]
+
+    def predict_salaries(self, countries, educations, experiences):
+        ''' Returns the predicted salaries of the arrays of countries, educations and years of experience
+        raises ValueError for a country or education the model does not know, as a LabelEncoder would
+        '''
+
+        x = np.column_stack([
+            encode(countries, self.countries, 'country'),
+            encode(educations, self.educations, 'education'),
+            np.asarray(experiences, dtype=float)
+            ])
+
+        return self.predict(x)
+
+
+def category_codes(values, categories):
+    ''' Returns (codes, unknown) of the values, their indices in the sorted array categories, and the boolean array of
+    the values not in categories (their codes are of another category)
+    '''
+
+    values = np.asarray(values).astype(str)
+    codes = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+
+    return codes, categories[codes] != values
+
+
+def encode(values, categories, label):
+    ''' Returns the codes (indices in the sorted array categories) of the values
+    '''
+
+    values = np.asarray(values).astype(str)
+    codes, unknown = category_codes(values, categories)
+    if unknown.any():
+        raise ValueError(f'Unknown {label}: {", ".join(sorted(set(values[unknown])))}')
+
+    return codes
+
+
+def export_model(model, x, path=MODEL_FILE):
+    ''' Saves model (the dict of the regressor and LabelEncoders) as a TreeModel to path, returns the TreeModel as loaded
+    raises ValueError if the loaded model does not predict the same salaries as model for the rows of x
+    '''
+
+    TreeModel.from_sklearn(model).save(path)
+    loaded = TreeModel.load(path, mmap=False)  # not mapped, so the next export (i.e. a rerun) can replace the file
+
+    if not np.array_equal(loaded.predict(x), model['model'].predict(np.asarray(x, dtype=float))):
+        raise ValueError(f'The model saved to {path} does not predict the same salaries as the trained model')
+
+    return loaded